@@ -0,0 +1,148 @@
+from models.best_time import BestTime
+from models.player_group import PlayerGroup
+from raids import RaidPlugin
+from sqlalchemy.orm import Session
+from typing import NamedTuple
+import numpy as np
+
+
+class BoardSplits(NamedTuple):
+    # Every team on the board, fastest first.
+    player_group_ids: np.ndarray
+    # The segment ticks of each team's best run, shaped (teams, segments).
+    # NaN where the run was submitted without splits.
+    run_splits: np.ndarray
+    # Each team's fastest ticks for every segment, from the room PBs of its
+    # players. NaN where none of the players have a PB for the segment.
+    best_splits: np.ndarray
+
+
+class SplitComparison(NamedTuple):
+    # The total if every segment matched the team's best, shaped (teams,).
+    sum_of_best: np.ndarray
+    # How much each segment of the run could improve on the team's best,
+    # shaped (teams, segments).
+    time_save: np.ndarray
+    # How far each segment is behind the board leader's run, negative where
+    # it is ahead, shaped (teams, segments).
+    behind_leader: np.ndarray
+
+
+def compare_splits(
+    run_splits: np.ndarray,
+    best_splits: np.ndarray,
+    leader_splits: np.ndarray
+) -> SplitComparison:
+    """ Compares the splits of any number of runs at once. Missing splits
+        are NaN and are left out of the sums.
+    """
+
+    # A run is never slower than its own splits, even if the room PBs have
+    # since been deleted.
+    best_splits = np.fmin(best_splits, run_splits)
+
+    return SplitComparison(
+        sum_of_best=np.nansum(best_splits, axis=-1),
+        time_save=run_splits - best_splits,
+        behind_leader=run_splits - leader_splits
+    )
+
+
+def get_team_best_splits(
+    member_groups: np.ndarray,
+    member_splits: np.ndarray,
+    player_group_ids: np.ndarray
+) -> np.ndarray:
+    """ Reduces the room PBs of every team member, one row per member, to
+        the fastest split of each team in the order of player_group_ids.
+    """
+
+    best_splits = np.full(
+        (len(player_group_ids), member_splits.shape[1]), np.nan
+    )
+    if len(member_groups) == 0:
+        return best_splits
+
+    # Sort the members by team so each team's rows can be reduced together.
+    order = np.argsort(member_groups, kind='stable')
+    member_groups = member_groups[order]
+    starts = np.flatnonzero(
+        np.r_[True, member_groups[1:] != member_groups[:-1]]
+    )
+    team_splits = np.fmin.reduceat(member_splits[order], starts, axis=0)
+
+    # Place each team's row at its position on the board.
+    board_order = np.argsort(player_group_ids)
+    rows = board_order[
+        np.searchsorted(player_group_ids[board_order], member_groups[starts])
+    ]
+    best_splits[rows] = team_splits
+
+    return best_splits
+
+
+def load_board_splits(
+    session: Session, raid: RaidPlugin, raid_type_id: int, scale_id: int
+) -> BoardSplits:
+    """ Loads the splits of every team's best run and the room PBs of their
+        players with one query each. Runs without splits are kept, so the
+        first row is always the board leader.
+    """
+
+    raid_time_model = raid.raid_time_model
+    room_time_model = raid.room_time_model
+
+    runs = session.query(
+        BestTime.player_group_id,
+        *[getattr(raid_time_model, room) for room in raid.segments]
+    ).outerjoin(
+        raid_time_model,
+        raid_time_model.speedrun_time_id == BestTime.speedrun_time_id
+    ).filter(
+        BestTime.raid_type_id == raid_type_id,
+        BestTime.scale_id == scale_id
+    ).order_by(BestTime.time, BestTime.speedrun_time_id).all()
+
+    if not runs:
+        empty = np.empty((0, len(raid.segments)))
+        return BoardSplits(np.empty(0, dtype=np.int64), empty, empty)
+
+    # Missing splits (None) become NaN.
+    runs = np.array(runs, dtype=float)
+    player_group_ids = runs[:, 0].astype(np.int64)
+    run_splits = runs[:, 1:]
+
+    # Join the members of each team with splits to their room PBs.
+    has_splits = ~np.isnan(run_splits).all(axis=1)
+    members = session.query(
+        PlayerGroup.id,
+        *[getattr(room_time_model, room) for room in raid.segments]
+    ).join(
+        room_time_model,
+        room_time_model.player_id == PlayerGroup.player_id
+    ).filter(
+        PlayerGroup.id.in_(player_group_ids[has_splits].tolist()),
+        room_time_model.scale_id == scale_id
+    ).all()
+    members = np.array(members, dtype=float).reshape(
+        -1, len(raid.segments) + 1
+    )
+
+    best_splits = get_team_best_splits(
+        members[:, 0].astype(np.int64), members[:, 1:], player_group_ids
+    )
+
+    return BoardSplits(player_group_ids, run_splits, best_splits)
+
+
+def find_team_row(board: BoardSplits, player_group_id: int) -> int | None:
+    """ Returns the row of a team's run on the board, or None if the team
+        has no run with splits.
+    """
+
+    rows = (
+        (board.player_group_ids == player_group_id) &
+        ~np.isnan(board.run_splits).all(axis=1)
+    ).nonzero()[0]
+
+    return int(rows[0]) if len(rows) else None
@@ -0,0 +1,253 @@
+from db import get_session
+from models.player import Player
+from models.raid_type import RaidType
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import object_session
+from typing import Hashable
+import threading
+import time
+
+
+# The most choices Discord shows for an autocomplete.
+MAX_CHOICES = 25
+
+# How often the index is reloaded, in seconds, to pick up rows changed
+# outside of the bot.
+REFRESH_INTERVAL = 600
+
+# The key of Session.info the changes to apply on commit are kept under.
+CHANGES_KEY = 'choice_index_changes'
+
+
+class PrefixIndex():
+    """ A trie of names, found by a prefix of the name or of any word in it,
+        ignoring case. Each name belongs to a value, such as a Discord ID,
+        so different values can share a name.
+    """
+
+    def __init__(self):
+        self._root = {}
+        self._names = {}
+
+    @staticmethod
+    def _get_keys(name: str) -> set[str]:
+        name = name.lower()
+
+        return {name} | {
+            name[i:] for i in range(1, len(name)) if name[i - 1] == ' '
+        }
+
+    def add(self, value: Hashable, name: str) -> None:
+        self.remove(value)
+        self._names[value] = name
+
+        for key in self._get_keys(name):
+            node = self._root
+            for character in key:
+                node = node.setdefault(character, {})
+            # Values are kept under the None key of the node a key ends at.
+            node.setdefault(None, set()).add(value)
+
+    def remove(self, value: Hashable) -> None:
+        name = self._names.pop(value, None)
+        if name is None:
+            return
+
+        for key in self._get_keys(name):
+            path = [self._root]
+            for character in key:
+                path.append(path[-1][character])
+            path[-1][None].discard(value)
+
+            # Prune the nodes left with no values and no children, on the
+            # way back up.
+            for parent, node, character in zip(
+                reversed(path[:-1]), reversed(path[1:]), reversed(key)
+            ):
+                if not node.get(None):
+                    node.pop(None, None)
+                if node:
+                    break
+                del parent[character]
+
+    def get_name(self, value: Hashable) -> str | None:
+        return self._names.get(value)
+
+    def find(self, name: str) -> Hashable | None:
+        """ Returns a value with exactly this name, ignoring case. """
+
+        for value in self.search(name, limit=MAX_CHOICES):
+            if self._names[value].lower() == name.lower():
+                return value
+
+        return None
+
+    def search(self, prefix: str, limit: int = MAX_CHOICES) -> list:
+        """ Returns up to limit values whose names start with the prefix,
+            in alphabetical order of the matching key.
+        """
+
+        node = self._root
+        for character in prefix.lower():
+            node = node.get(character)
+            if node is None:
+                return []
+
+        values = []
+        stack = [node]
+        while stack and len(values) < limit:
+            node = stack.pop()
+            for value in sorted(node.get(None, ()), key=self._names.get):
+                if value not in values:
+                    values.append(value)
+            # Push the children in reverse so the smallest is visited first.
+            stack.extend(
+                node[character] for character in sorted(
+                    (key for key in node if key is not None), reverse=True
+                )
+            )
+
+        return values[:limit]
+
+
+class ChoiceIndex():
+    """ The raid types and players offered by autocompletes, kept in memory
+        so answering them does not touch the database. Rows the bot writes
+        are recorded as they are flushed and indexed once their session
+        commits, so rolled back rows are never offered. The whole index is
+        reloaded every REFRESH_INTERVAL for rows changed outside of the bot.
+    """
+
+    def __init__(self):
+        self.raid_types = PrefixIndex()
+        self.players = PrefixIndex()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def load(self) -> None:
+        raid_types = PrefixIndex()
+        players = PrefixIndex()
+
+        with get_session() as session:
+            for identifier, in session.query(RaidType.identifier):
+                raid_types.add(identifier, identifier)
+            for discord_id, name in session.query(
+                Player.discord_id, Player.name
+            ):
+                players.add(int(discord_id), name)
+
+        with self._lock:
+            self.raid_types = raid_types
+            self.players = players
+
+    def _refresh(self) -> None:
+        while True:
+            time.sleep(REFRESH_INTERVAL)
+            try:
+                self.load()
+            except Exception as e:
+                print(f'Error reloading the autocomplete index: {e}')
+
+    def start(self) -> None:
+        """ Loads the index and keeps it up to date. """
+
+        self.load()
+
+        event.listen(RaidType, 'after_insert', self._on_raid_type_change)
+        event.listen(RaidType, 'after_update', self._on_raid_type_change)
+        event.listen(RaidType, 'after_delete', self._on_raid_type_delete)
+        event.listen(Player, 'after_insert', self._on_player_change)
+        event.listen(Player, 'after_update', self._on_player_change)
+        event.listen(Player, 'after_delete', self._on_player_delete)
+        event.listen(Session, 'after_commit', self._on_commit)
+        event.listen(Session, 'after_rollback', self._on_rollback)
+
+        self._thread = threading.Thread(target=self._refresh, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _record(target, index: str, value: Hashable, name: str | None):
+        """ Records a change to an index, to apply once the session of the
+            row commits. A name of None removes the value.
+        """
+
+        session = object_session(target)
+        session.info.setdefault(CHANGES_KEY, []).append((index, value, name))
+
+    def _on_raid_type_change(self, mapper, connection, raid_type) -> None:
+        # Drop the old identifier of a renamed raid type.
+        for identifier in inspect(raid_type).attrs.identifier.history.deleted:
+            self._record(raid_type, 'raid_types', identifier, None)
+
+        self._record(
+            raid_type, 'raid_types', raid_type.identifier, raid_type.identifier
+        )
+
+    def _on_raid_type_delete(self, mapper, connection, raid_type) -> None:
+        self._record(raid_type, 'raid_types', raid_type.identifier, None)
+
+    def _on_player_change(self, mapper, connection, player) -> None:
+        self._record(player, 'players', int(player.discord_id), player.name)
+
+    def _on_player_delete(self, mapper, connection, player) -> None:
+        self._record(player, 'players', int(player.discord_id), None)
+
+    def _on_commit(self, session: Session) -> None:
+        changes = session.info.pop(CHANGES_KEY, [])
+
+        with self._lock:
+            for index, value, name in changes:
+                if name is None:
+                    getattr(self, index).remove(value)
+                else:
+                    getattr(self, index).add(value, name)
+
+    def _on_rollback(self, session: Session) -> None:
+        session.info.pop(CHANGES_KEY, None)
+
+    def search_raid_types(self, prefix: str) -> list[str]:
+        with self._lock:
+            return self.raid_types.search(prefix)
+
+    def complete_runners(self, runners: str) -> list[tuple[str, str]]:
+        """ Completes the last runner of a comma separated list, returning
+            (names, Discord IDs) for each player whose name starts with it.
+            Earlier runners can be mentions, Discord IDs or exact player
+            names. Bare IDs are returned rather than mentions, so a full
+            team fits in Discord's 100 character limit for a choice.
+        """
+
+        *previous, prefix = [runner.strip() for runner in runners.split(',')]
+
+        with self._lock:
+            discord_ids = []
+            for runner in previous:
+                if (
+                    runner.startswith('<@') and runner.endswith('>') and
+                    runner[2:-1].isdigit()
+                ):
+                    discord_id = int(runner[2:-1])
+                elif runner.isdigit():
+                    discord_id = int(runner)
+                else:
+                    discord_id = self.players.find(runner)
+                if discord_id is None:
+                    return []
+                discord_ids.append(discord_id)
+
+            completions = []
+            for discord_id in self.players.search(prefix):
+                if discord_id in discord_ids:
+                    continue
+
+                team = discord_ids + [discord_id]
+                completions.append((
+                    ', '.join(
+                        self.players.get_name(_id) or str(_id) for _id in team
+                    ),
+                    ','.join(str(_id) for _id in team)
+                ))
+
+            return completions
@@ -0,0 +1,295 @@
+from concurrent.futures import ProcessPoolExecutor
+from db import get_session
+from models.best_time import create_best_time_table
+from models.player_best_time import create_player_best_time_table
+from models.speedrun_time import SpeedrunTime
+from parsers import CmPaste
+from parsers import ParseError
+from parsers import TobRaid
+from raids import RAID_PLUGINS
+from raids import get_raid_plugin
+from service import SubmissionError
+from service import get_raid_type
+from service import get_runner_names
+from service import get_scale
+from service import notify_time_listeners
+from service import record_best_time
+from service import upsert_runners
+from service import update_room_pbs
+from typing import AsyncIterable, AsyncIterator, Iterable, NamedTuple
+import argparse
+import os
+
+
+# The number of raids written per transaction.
+BATCH_SIZE = 500
+
+
+class ImportSummary(NamedTuple):
+    imported: int
+    duplicates: int
+    skipped: list[str]
+
+
+class BulkImporter():
+    """ Imports many raids for the same runners, writing them in batches.
+        Each batch inserts its runs and raid times together and merges the
+        room PBs once for the whole batch.
+    """
+
+    def __init__(self, raid_type: str, runners: dict[int, str]):
+        plugin = get_raid_plugin(raid_type)
+        if plugin is None:
+            raise SubmissionError(f'{raid_type} cannot be bulk imported.')
+
+        self._raid_time_model = plugin.raid_time_model
+        self._room_time_model = plugin.room_time_model
+        self._pending = []
+        self._imported = 0
+        self._duplicates = 0
+        self._skipped = []
+
+        with get_session() as session:
+            raid = get_raid_type(session, raid_type)
+            scale = get_scale(session, len(runners))
+
+            # Make sure the runners have a group to submit the runs under.
+            self._players, self._player_group_id = upsert_runners(
+                session, runners
+            )
+
+            # Write any renamed players, then detach everything before
+            # committing so the players stay loaded for the batches written
+            # in later sessions.
+            session.flush()
+            session.expunge_all()
+            session.commit()
+
+            self._raid_type_id = raid.id
+            self._scale_id = scale.id
+            self._scale = scale.value
+
+            # Load the times already submitted so duplicates can be skipped
+            # without querying for every raid.
+            self._existing_times = {
+                time for time, in session.query(SpeedrunTime.time).filter(
+                    SpeedrunTime.raid_type_id == self._raid_type_id,
+                    SpeedrunTime.scale_id == self._scale_id,
+                    SpeedrunTime.player_group_id == self._player_group_id
+                )
+            }
+
+    def get_imported(self) -> int:
+        """ Returns the number of raids written so far. """
+
+        return self._imported
+
+    def add(self, raid: CmPaste | TobRaid | ParseError) -> None:
+        """ Queues a raid for import, writing a batch once it is full. """
+
+        if isinstance(raid, ParseError):
+            self._skipped.append(raid.message)
+            return
+
+        if raid.scale != self._scale:
+            self._skipped.append(
+                f'Raid of scale {raid.scale} does not match the '
+                f'{self._scale} runners submitted.'
+            )
+            return
+
+        if raid.completed in self._existing_times:
+            self._duplicates += 1
+            return
+
+        self._existing_times.add(raid.completed)
+        self._pending.append(raid)
+
+        if len(self._pending) >= BATCH_SIZE:
+            self.flush()
+
+    def add_all(
+        self, raids: Iterable[CmPaste | TobRaid | ParseError]
+    ) -> None:
+        for raid in raids:
+            self.add(raid)
+
+    def flush(self) -> int:
+        """ Writes the queued raids in a single transaction. Returns the
+            number of raids written.
+        """
+
+        if not self._pending:
+            return 0
+
+        raids, self._pending = self._pending, []
+
+        with get_session() as session:
+            speedrun_times = [
+                SpeedrunTime(
+                    raid_type_id=self._raid_type_id,
+                    scale_id=self._scale_id,
+                    player_group_id=self._player_group_id,
+                    time=raid.completed
+                )
+                for raid in raids
+            ]
+            session.add_all(speedrun_times)
+            session.flush()
+
+            # Only the fastest run in the batch can be the group's best.
+            record_best_time(
+                session,
+                min(speedrun_times, key=lambda run: (run.time, run.id))
+            )
+
+            session.add_all([
+                self._raid_time_model(
+                    speedrun_time_id=speedrun_time.id,
+                    completed=raid.completed,
+                    **raid.room_times
+                )
+                for speedrun_time, raid in zip(speedrun_times, raids)
+            ])
+
+            # Only the fastest time for each room in the batch can be a PB.
+            best_room_times = {}
+            for raid in raids:
+                for room, ticks in raid.room_times.items():
+                    best = best_room_times.get(room)
+                    if best is None or ticks < best:
+                        best_room_times[room] = ticks
+
+            update_room_pbs(
+                session,
+                self._room_time_model,
+                self._players,
+                self._scale_id,
+                best_room_times
+            )
+
+            session.commit()
+
+        notify_time_listeners(
+            self._raid_type_id, self._scale_id, self._player_group_id
+        )
+
+        self._imported += len(raids)
+
+        return len(raids)
+
+    def close(self) -> ImportSummary:
+        """ Writes any remaining raids and returns what was imported. """
+
+        self.flush()
+
+        return ImportSummary(
+            imported=self._imported,
+            duplicates=self._duplicates,
+            skipped=self._skipped
+        )
+
+
+def read_raids(
+    raid_type: str, lines: Iterable[str]
+) -> Iterable[CmPaste | TobRaid | ParseError]:
+    """ Splits an export into raids using the parser of the raid type. ToB
+        exports are CSVs from the raid tracker, CoX exports have one
+        analytics paste per line.
+    """
+
+    return RAID_PLUGINS[raid_type].read_export(lines)
+
+
+def stream_raids(
+    raid_type: str, lines: AsyncIterable[str]
+) -> AsyncIterator[CmPaste | TobRaid | ParseError]:
+    """ Splits an export into raids as it is downloaded. """
+
+    return RAID_PLUGINS[raid_type].stream_export(lines)
+
+
+def read_file(
+    raid_type: str, path: str
+) -> list[CmPaste | TobRaid | ParseError]:
+    """ Parses every raid in an export file. """
+
+    with open(path, encoding='utf-8') as f:
+        return list(read_raids(raid_type, f))
+
+
+def find_files(paths: list[str]) -> list[str]:
+    """ Expands any directories into the files inside them. """
+
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if os.path.isfile(file_path):
+                files.append(file_path)
+
+    return files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            'Import every raid in ToB CSV or CoX paste exports. Files are '
+            'parsed in parallel and written to the database in batches.'
+        )
+    )
+    parser.add_argument('raid_type', choices=sorted(RAID_PLUGINS))
+    parser.add_argument(
+        'runners', help='Discord IDs of the runners (comma separated)'
+    )
+    parser.add_argument(
+        'paths', nargs='+', help='Export files, or directories of them'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='Number of processes used to parse files'
+    )
+    args = parser.parse_args()
+
+    discord_ids = [int(_id) for _id in args.runners.split(',')]
+    files = find_files(args.paths)
+
+    create_best_time_table()
+    create_player_best_time_table()
+
+    with get_session() as session:
+        runners = get_runner_names(session, discord_ids)
+    if len(runners) != len(discord_ids):
+        parser.exit(1, 'One or more of the runners is not in the database.\n')
+
+    try:
+        importer = BulkImporter(args.raid_type, runners)
+    except SubmissionError as e:
+        parser.exit(1, f'{e}\n')
+
+    # Parse the files in worker processes while this process writes the
+    # raids to the database.
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        parsed_files = executor.map(
+            read_file, [args.raid_type] * len(files), files
+        )
+        for path, raids in zip(files, parsed_files):
+            print(f'Parsed {len(raids)} raids from {path}.')
+            importer.add_all(raids)
+            print(f'Imported {importer.get_imported()} raids so far.')
+    summary = importer.close()
+
+    print(
+        f'Imported {summary.imported} raids, skipped {summary.duplicates} '
+        f'duplicates and {len(summary.skipped)} invalid raids.'
+    )
+    for reason in summary.skipped:
+        print(f'Skipped: {reason}')
+
+
+if __name__ == '__main__':
+    main()
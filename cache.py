@@ -0,0 +1,174 @@
+from multiprocessing.managers import BaseManager
+from typing import Any, Callable, Hashable
+import os
+import threading
+
+
+# Set by shards.py for each bot it starts, so they share invalidations.
+CACHE_ADDRESS_VARIABLE = 'SPEEDRUN_CACHE_ADDRESS'
+CACHE_AUTHKEY_VARIABLE = 'SPEEDRUN_CACHE_AUTHKEY'
+
+
+class MemoryCache():
+    """ Values cached in this process only. """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """ Returns the cached value for a key, loading it on first use.
+            None is not cached, so missing values are loaded again.
+        """
+
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+
+        value = load()
+        if value is None:
+            return None
+
+        with self._lock:
+            return self._values.setdefault(key, value)
+
+    def update(self, key: Hashable, update: Callable[[Any], None]) -> None:
+        """ Changes a cached value in place. Keys that are not cached are
+            skipped.
+        """
+
+        with self._lock:
+            if key in self._values:
+                update(self._values[key])
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class Generations():
+    """ A counter for each key, increased whenever the key is invalidated.
+        Held by the cache server started by shards.py.
+    """
+
+    def __init__(self):
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> int:
+        return self._generations.get(key, 0)
+
+    def increment(self, key: Hashable) -> int:
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            return self._generations[key]
+
+
+class CacheManager(BaseManager):
+    pass
+
+
+class CacheServerManager(BaseManager):
+    pass
+
+
+class SharedCache(MemoryCache):
+    """ Values cached in each process, invalidated in every process. Each
+        value is kept with the generation of its key when it was loaded and
+        is loaded again once another process has increased the generation.
+        A multiprocessing manager stands in for a cache server such as
+        Redis.
+    """
+
+    def __init__(self, address: tuple[str, int], authkey: bytes):
+        super().__init__()
+        CacheManager.register('get_generations')
+        manager = CacheManager(address=address, authkey=authkey)
+        manager.connect()
+        self._generations = manager.get_generations()
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        generation = self._generations.get(key)
+
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and entry[0] == generation:
+                return entry[1]
+
+        # A value loaded while the key is invalidated is older than the new
+        # generation, so it is loaded again on the next get.
+        value = load()
+        if value is None:
+            return None
+
+        with self._lock:
+            self._values[key] = (generation, value)
+
+        return value
+
+    def update(self, key: Hashable, update: Callable[[Any], None]) -> None:
+        """ Changes a cached value in place in this process and invalidates
+            it in the others.
+        """
+
+        generation = self._generations.increment(key)
+
+        with self._lock:
+            entry = self._values.pop(key, None)
+            # Only keep the value if no other process invalidated it since
+            # it was loaded.
+            if entry is not None and entry[0] == generation - 1:
+                update(entry[1])
+                self._values[key] = (generation, entry[1])
+
+    def invalidate(self, key: Hashable) -> None:
+        self._generations.increment(key)
+
+        with self._lock:
+            self._values.pop(key, None)
+
+
+def start_cache_server() -> tuple[tuple[str, int], bytes]:
+    """ Serves the generations of a SharedCache from a thread of this
+        process. Returns the address and key to connect with.
+    """
+
+    generations = Generations()
+    CacheServerManager.register(
+        'get_generations', callable=lambda: generations
+    )
+
+    authkey = os.urandom(16)
+    server = CacheServerManager(
+        address=('127.0.0.1', 0), authkey=authkey
+    ).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server.address, authkey
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> MemoryCache:
+    """ Returns the cache of this process. Bots started by shards.py share
+        invalidations through its cache server. Otherwise values are only
+        cached in this process.
+    """
+
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            address = os.environ.get(CACHE_ADDRESS_VARIABLE)
+            if address:
+                host, port = address.rsplit(':', 1)
+                _cache = SharedCache(
+                    (host, int(port)),
+                    bytes.fromhex(os.environ[CACHE_AUTHKEY_VARIABLE])
+                )
+            else:
+                _cache = MemoryCache()
+
+        return _cache
@@ -0,0 +1,132 @@
+from db import engine
+from decimal import Decimal
+from models.cm_raid_time import CmRaidTime
+from models.cm_room_time import CmRoomTime
+from models.player import Player
+from models.player_group import PlayerGroup
+from models.raid_type import RaidType
+from models.scale import Scale
+from models.speedrun_time import SpeedrunTime
+from models.tob_raid_time import TobRaidTime
+from models.tob_room_time import TobRoomTime
+from sqlalchemy import Column
+from sqlalchemy import Table
+from sqlalchemy import select
+import argparse
+import datetime
+import os
+
+
+# The tables written by an export, each to its own file.
+EXPORT_TABLES = tuple(
+    model.__table__ for model in (
+        SpeedrunTime,
+        CmRaidTime,
+        TobRaidTime,
+        CmRoomTime,
+        TobRoomTime,
+        Player,
+        PlayerGroup,
+        RaidType,
+        Scale
+    )
+)
+
+# The number of rows fetched from the server and written at a time.
+BATCH_SIZE = 10000
+
+
+def get_arrow_type(column: Column):
+    """ Returns the Arrow type for a column, so every batch of a table is
+        written with the same schema. Unknown types are written as strings.
+    """
+
+    import pyarrow as pa
+
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return pa.string()
+
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is Decimal and column.type.precision is not None:
+        return pa.decimal128(column.type.precision, column.type.scale or 0)
+    if python_type is datetime.datetime:
+        return pa.timestamp('us')
+    if python_type is datetime.date:
+        return pa.date32()
+
+    return pa.string()
+
+
+def export_table(table: Table, path: str, compression: str) -> int:
+    """ Streams a table into a Parquet file batch by batch, so memory use
+        does not grow with the size of the table. Returns the number of rows
+        written.
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        pa.field(column.name, get_arrow_type(column), column.nullable)
+        for column in table.columns
+    ])
+    rows_written = 0
+
+    with engine.connect() as connection, pq.ParquetWriter(
+        path, schema, compression=compression
+    ) as writer:
+        # Fetch the rows with a server side cursor rather than all at once.
+        result = connection.execution_options(
+            yield_per=BATCH_SIZE
+        ).execute(select(table).order_by(*table.primary_key))
+
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(columns, schema)
+                ],
+                schema=schema
+            ))
+            rows_written += len(rows)
+
+    return rows_written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            'Export every run, raid time and room time to Parquet files for '
+            'analysis outside of the bot. Requires pyarrow.'
+        )
+    )
+    parser.add_argument('directory', help='Where to write the files')
+    parser.add_argument(
+        '--compression', default='zstd',
+        choices=['zstd', 'snappy', 'gzip', 'none'],
+        help='How to compress the files'
+    )
+    args = parser.parse_args()
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        parser.exit(1, 'Exporting needs pyarrow: pip install pyarrow\n')
+
+    os.makedirs(args.directory, exist_ok=True)
+    for table in EXPORT_TABLES:
+        path = os.path.join(args.directory, f'{table.name}.parquet')
+        rows_written = export_table(table, path, args.compression)
+        print(f'Exported {rows_written} rows from {table.name} to {path}.')
+
+
+if __name__ == '__main__':
+    main()
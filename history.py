@@ -0,0 +1,68 @@
+from models.player_group import PlayerGroup
+from models.speedrun_time import SpeedrunTime
+from sqlalchemy.orm import Session
+from typing import NamedTuple
+
+
+# The number of runs shown on each page of a player's history.
+HISTORY_PAGE_SIZE = 10
+
+
+class HistoryRun(NamedTuple):
+    id: int
+    time: int
+    player_group_id: int
+
+
+class HistoryPage(NamedTuple):
+    # Newest first.
+    runs: list[HistoryRun]
+    has_newer: bool
+    has_older: bool
+
+
+def get_history_page(
+    session: Session,
+    raid_type_id: int,
+    scale_id: int,
+    player_id: int,
+    older_than: int | None = None,
+    newer_than: int | None = None,
+    limit: int = HISTORY_PAGE_SIZE
+) -> HistoryPage:
+    """ Returns a page of a player's runs with any team, newest first.
+        Pages are found by seeking past the ID of the run at the edge of the
+        previous page, and only the columns shown are loaded.
+    """
+
+    query = session.query(
+        SpeedrunTime.id, SpeedrunTime.time, SpeedrunTime.player_group_id
+    ).join(
+        PlayerGroup, SpeedrunTime.player_group_id == PlayerGroup.id
+    ).filter(
+        SpeedrunTime.raid_type_id == raid_type_id,
+        SpeedrunTime.scale_id == scale_id,
+        PlayerGroup.player_id == player_id
+    )
+
+    if newer_than is not None:
+        query = query.filter(
+            SpeedrunTime.id > newer_than
+        ).order_by(SpeedrunTime.id)
+    else:
+        if older_than is not None:
+            query = query.filter(SpeedrunTime.id < older_than)
+        query = query.order_by(SpeedrunTime.id.desc())
+
+    # Fetch one extra run to know if there is another page.
+    runs = [HistoryRun(*run) for run in query.limit(limit + 1)]
+    has_more = len(runs) > limit
+    runs = runs[:limit]
+
+    if newer_than is not None:
+        runs.reverse()
+        return HistoryPage(runs=runs, has_newer=has_more, has_older=True)
+
+    return HistoryPage(
+        runs=runs, has_newer=older_than is not None, has_older=has_more
+    )
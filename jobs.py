@@ -0,0 +1,55 @@
+from typing import Any, Callable
+import asyncio
+
+
+class JobQueue():
+    """ Runs blocking work, such as database writes, on a fixed number of
+        worker threads. Handlers wait for their job without blocking the
+        event loop, and bursts of submissions queue up instead of all
+        hitting the database at once.
+    """
+
+    def __init__(self, concurrency: int = 2, max_queued: int = 100):
+        self._concurrency = concurrency
+        self._max_queued = max_queued
+        self._queue = None
+        self._workers = []
+
+    def _start(self) -> None:
+        # The queue and workers need the running event loop, so they are
+        # created on first use.
+        self._queue = asyncio.Queue(maxsize=self._max_queued)
+        self._workers = [
+            asyncio.create_task(self._work())
+            for _ in range(self._concurrency)
+        ]
+
+    async def _work(self) -> None:
+        while True:
+            func, args, kwargs, future = await self._queue.get()
+            try:
+                if not future.cancelled():
+                    result = await asyncio.to_thread(func, *args, **kwargs)
+                    if not future.cancelled():
+                        future.set_result(result)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """ Queues a job and waits for its result. Exceptions raised by the
+            job are raised here.
+        """
+
+        if self._queue is None:
+            self._start()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, kwargs, future))
+
+        return await future
+
+    def qsize(self) -> int:
+        return 0 if self._queue is None else self._queue.qsize()
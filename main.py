@@ -1,54 +1,705 @@
+from analysis import compare_splits
+from analysis import find_team_row
+from analysis import load_board_splits
+from autocomplete import ChoiceIndex
+from bulk_import import BATCH_SIZE
+from bulk_import import BulkImporter
+from bulk_import import stream_raids
 from config import TOKEN
 from db import get_session
 from embed import confirmation_to_embed
 from embed import error_to_embed
+from embed import history_to_embed
 from embed import leaderboard_to_embed
-from embed import pb_cm_raid_to_embed
-from embed import pb_cm_room_to_embed
 from embed import pb_to_embed
-from embed import pb_tob_raid_to_embed
-from embed import pb_tob_room_to_embed
-from models.cm_raid_time import CmRaidTime
-from models.cm_room_time import CmRoomTime
+from embed import rank_to_embed
+from embed import room_pbs_to_embed
+from embed import splits_to_embed
+from embed import stats_to_embed
+from history import get_history_page
+from interactions.client.smart_cache import create_cache
+from jobs import JobQueue
+from models.best_time import create_best_time_table
+from models.leaderboards import IndividualLeaderboards
+from models.leaderboards import LeaderboardPage
 from models.leaderboards import Leaderboards
 from models.player import Player
-from models.player_group import PlayerGroup
+from models.player_best_time import PlayerBestTime
+from models.player_best_time import create_player_best_time_table
 from models.raid_type import RaidType
 from models.scale import Scale
 from models.speedrun_time import SpeedrunTime
-from models.tob_raid_time import TobRaidTime
-from models.tob_room_time import TobRoomTime
+from parsers import CmPaste
+from parsers import ParseError
+from parsers import TobRaid
+from parsers import parse_cm_paste
+from parsers import parse_tob_csv_stream
+from raids import CM
+from raids import RAID_PLUGINS
+from raids import RaidPlugin
+from raids import TOB
+from raids import get_raid_plugin
+from rankings import Rankings
+from response import Response
+from send_queue import SendQueue
+from service import SubmissionError
+from service import add_time_listener
+from service import delete_time
+from service import get_group_names
+from service import get_raid_type
+from service import get_runners
+from service import get_scale
+from service import parse_runners
+from service import submit_raid
+from service import submit_time
+from shards import SHARD_ID_VARIABLE
+from shards import TOTAL_SHARDS_VARIABLE
+from snapshot import Snapshot
+from snapshot import SnapshotIndividualLeaderboards
+from snapshot import SnapshotLeaderboards
+from snapshot import SnapshotWriter
+from snapshot import write_snapshot
+from sqlalchemy.orm import Session
+from stats import Statistics
 from util import download_attachment
-from util import format_discord_ids
-from util import get_cm_rooms
-from util import get_player_group_id
-from util import get_players_from_discord_ids
 from util import get_raid_choices
 from util import get_scale_choices
-from util import is_valid_cm_paste
 from util import is_valid_gametime
-from util import is_valid_runner_list
-from util import open_attachment
+from util import member_resolver
+from util import stream_attachment_lines
 from util import sync_screenshot_state
 from util import ticks_to_time_string
-from util import time_string_to_ticks
 from util import validate_runners
+import config
 import datetime
+import functools
 import interactions
+import os
 import re
 
 
-# Intents.
-intents = interactions.Intents.ALL
-intents.members = True
+# How long members are cached for in minimal mode, in seconds, and how many.
+MEMBER_CACHE_TTL = 600
+MEMBER_CACHE_SIZE = 1000
 
-# Initialize the bot.
-bot = interactions.Client(token=TOKEN, intents=intents)
+# Intents. In minimal mode the bot only receives guild events, and only
+# keeps recently seen members, fetching other members when they are needed.
+MINIMAL_INTENTS = getattr(config, 'MINIMAL_INTENTS', False)
+if MINIMAL_INTENTS:
+    intents = interactions.Intents.GUILDS
+    caches = {
+        'member_cache': create_cache(MEMBER_CACHE_TTL, MEMBER_CACHE_SIZE),
+        'user_cache': create_cache(MEMBER_CACHE_TTL, MEMBER_CACHE_SIZE)
+    }
+else:
+    intents = interactions.Intents.ALL
+    intents.members = True
+    caches = {}
+
+# The gateway shard this bot connects as, set by shards.py.
+SHARD_ID = int(os.environ.get(SHARD_ID_VARIABLE, 0))
+TOTAL_SHARDS = int(os.environ.get(TOTAL_SHARDS_VARIABLE, 1))
+
+# Initialize the bot. Commands are synced with Discord by the first shard
+# only.
+bot = interactions.Client(
+    token=TOKEN,
+    intents=intents,
+    shard_id=SHARD_ID,
+    total_shards=TOTAL_SHARDS,
+    sync_interactions=SHARD_ID == 0,
+    **caches
+)
+
+# Make sure leaderboards can be read from the best time of each group and
+# player.
+create_best_time_table()
+create_player_best_time_table()
 
 # Get all raid and scale choices for the slash commands.
 raid_choices = get_raid_choices()
 scale_choices = get_scale_choices()
-cm_rooms = get_cm_rooms()
+
+# The leaderboard for each /leaderboards mode.
+LEADERBOARD_MODES = {
+    Leaderboards.MODE: Leaderboards,
+    IndividualLeaderboards.MODE: IndividualLeaderboards
+}
+
+# Read leaderboards from a memory mapped snapshot if one is configured. Bots
+# sharing the snapshot file share its pages and do not query the database
+# for them.
+SNAPSHOT_PATH = getattr(config, 'SNAPSHOT_PATH', None)
+snapshot = None
+if SNAPSHOT_PATH:
+    snapshot = Snapshot(SNAPSHOT_PATH)
+    LEADERBOARD_MODES = {
+        Leaderboards.MODE: functools.partial(
+            SnapshotLeaderboards, snapshot=snapshot
+        ),
+        IndividualLeaderboards.MODE: functools.partial(
+            SnapshotIndividualLeaderboards, snapshot=snapshot
+        )
+    }
+    if not os.path.exists(SNAPSHOT_PATH):
+        write_snapshot(SNAPSHOT_PATH)
+
+# Runs database work for submissions off the event loop.
+jobs = JobQueue()
+
+# Sends submission responses within each channel's rate limit.
+send_queue = SendQueue()
+
+# The leaderboards kept in memory for rank lookups, updated on every write.
+rankings = Rankings()
+add_time_listener(rankings.update)
+
+# The statistics of each board, computed on first use until its next write.
+statistics = Statistics()
+add_time_listener(statistics.invalidate)
+
+# Write the snapshot again after runs are saved or deleted.
+if SNAPSHOT_PATH:
+    add_time_listener(SnapshotWriter(SNAPSHOT_PATH).update)
+
+# The raid types and players offered by autocompletes, kept in memory.
+choice_index = ChoiceIndex()
+choice_index.start()
+
+
+def save_run(
+    raid_type: str,
+    scale: int,
+    runners: dict[int, str],
+    time_in_ticks: int,
+    image_name: str
+) -> Response:
+    """ Saves a run and builds the response to send. This blocks, so it is
+        run on the job queue.
+    """
+
+    with get_session() as session:
+        new_time = submit_time(
+            session,
+            raid_type,
+            scale,
+            runners,
+            time_in_ticks,
+            screenshot=image_name
+        )
+
+        # Format the time for the response.
+        formatted_time = ticks_to_time_string(time_in_ticks)
+        message = (
+            f'Submitted `{formatted_time}` in {raid_type} with '
+            f'{new_time.get_scale().identifier} scale.'
+        )
+
+        response = Response()
+        response.add(confirmation_to_embed('Submission', message))
+
+        # Display the new time.
+        response.add(
+            pb_to_embed(new_time),
+            interactions.File(f'attachments/{new_time.screenshot}')
+        )
+
+        return response
+
+
+def save_raid(
+    raid_type: str, runners: dict[int, str], raid: CmPaste | TobRaid
+) -> Response:
+    """ Saves a run with room times and builds the response to send. This
+        blocks, so it is run on the job queue.
+    """
+
+    plugin = get_raid_plugin(raid_type)
+    response = Response()
+
+    with get_session() as session:
+        submission = submit_raid(session, raid_type, runners, raid)
+
+        if submission.room_pbs:
+            embed = room_pbs_to_embed(submission.room_pbs)
+            response.add(embed)
+
+        if submission.raid_time:
+            message = (
+                f'Submitted `{ticks_to_time_string(raid.completed)}` '
+                f'in {plugin.short_name} with {submission.scale.identifier} '
+                'scale.'
+            )
+            embed = confirmation_to_embed('Submission', message)
+            response.add(embed)
+
+            # Display the run in an embed.
+            embed = plugin.raid_time_to_embed(submission.raid_time)
+            response.add(embed)
+
+        else:
+            message = (
+                'The run submitted is not a personal best.\n'
+                'Any room times that were faster have still been updated.'
+            )
+            embed = confirmation_to_embed('Submission', message)
+            response.add(embed)
+
+    return response
+
+
+def remove_run(
+    raid_type: str,
+    scale: int,
+    discord_ids: list[int],
+    time_in_ticks: int,
+    runners: list[str]
+) -> interactions.Embed:
+    """ Deletes a run and builds the embed to send. This blocks, so it is
+        run on the job queue.
+    """
+
+    with get_session() as session:
+        deleted = delete_time(
+            session, raid_type, scale, discord_ids, time_in_ticks
+        )
+
+        # Get the scale object to display the identifier in the message.
+        scale = session.query(Scale).filter(
+            Scale.value == scale
+        ).first()
+
+        if deleted:
+            message = (
+                f'{raid_type} {scale.identifier} ({', '.join(runners)}) '
+                'deleted.'
+            )
+            return confirmation_to_embed('Deletion', message)
+
+        message = (
+            f'{raid_type} {scale.identifier} ({', '.join(runners)}) not '
+            'found.'
+        )
+        return error_to_embed('Deletion', message)
+
+
+def find_rank(
+    raid_type: str, scale: int, discord_ids: list[int]
+) -> interactions.Embed:
+    """ Finds where the runners place on a leaderboard and builds the embed
+        to show. This blocks, so it is run on the job queue.
+    """
+
+    with get_session() as session:
+        raid = get_raid_type(session, raid_type)
+        scale = get_scale(session, scale)
+        players, player_group_id = get_runners(session, discord_ids)
+
+        standing = None
+        if player_group_id is not None and len(players) == len(discord_ids):
+            standing = rankings.get_standing(
+                raid.id, scale.id, player_group_id
+            )
+        if standing is None:
+            raise SubmissionError(
+                'These runners do not have a time on this leaderboard.'
+            )
+
+        neighbours = [
+            neighbour_id
+            for _, neighbour_id in filter(
+                None, [standing.ahead, standing.behind]
+            )
+        ]
+        group_names = get_group_names(
+            session, [player_group_id] + neighbours
+        )
+
+        return rank_to_embed(
+            raid.identifier,
+            scale.identifier,
+            player_group_id,
+            standing,
+            group_names
+        )
+
+
+def show_stats(raid_type: str, scale: int) -> interactions.Embed:
+    """ Builds the statistics embed for a board. This blocks, so it is run
+        on the job queue.
+    """
+
+    with get_session() as session:
+        raid = get_raid_type(session, raid_type)
+        scale = get_scale(session, scale)
+
+        stats = statistics.get_stats(raid.id, scale.id)
+        if stats is None:
+            raise SubmissionError(
+                'There are no runs on this leaderboard yet.'
+            )
+
+        return stats_to_embed(raid.identifier, scale.identifier, stats)
+
+
+def compare_team_splits(
+    raid_type: str, scale: int, discord_ids: list[int]
+) -> interactions.Embed:
+    """ Compares the splits of a team's best run with their room PBs and
+        the board leader's run. The leader's splits are missing if their run
+        has none. The whole board is compared at once, so this blocks and is
+        run on the job queue.
+    """
+
+    raid_plugin = get_raid_plugin(raid_type)
+
+    with get_session() as session:
+        raid = get_raid_type(session, raid_type)
+        scale = get_scale(session, scale)
+        players, player_group_id = get_runners(session, discord_ids)
+
+        board = load_board_splits(session, raid_plugin, raid.id, scale.id)
+        row = None
+        if player_group_id is not None and len(players) == len(discord_ids):
+            row = find_team_row(board, player_group_id)
+        if row is None:
+            raise SubmissionError(
+                'These runners do not have a run with splits on this '
+                'leaderboard.'
+            )
+
+        comparison = compare_splits(
+            board.run_splits, board.best_splits, board.run_splits[0]
+        )
+
+        return splits_to_embed(
+            raid.identifier,
+            scale.identifier,
+            [player.name for player in players],
+            [raid_plugin.rooms.labels[room] for room in raid_plugin.segments],
+            board.run_splits[row].tolist(),
+            comparison.time_save[row].tolist(),
+            comparison.behind_leader[row].tolist(),
+            float(comparison.sum_of_best[row])
+        )
+
+
+def find_personal_best(
+    session: Session, raid_type_id: int, scale_id: int, player_id: int
+) -> SpeedrunTime | None:
+    """ Finds a player's fastest run on a board. With a snapshot, only the
+        run itself is read from the database.
+    """
+
+    if snapshot is not None and snapshot.get_arrays() is not None:
+        speedrun_time_id = snapshot.get_player_best_id(
+            raid_type_id, scale_id, player_id
+        )
+        if speedrun_time_id is None:
+            return None
+
+        return session.get(SpeedrunTime, speedrun_time_id)
+
+    return session.query(SpeedrunTime).join(
+        PlayerBestTime,
+        PlayerBestTime.speedrun_time_id == SpeedrunTime.id
+    ).filter(
+        PlayerBestTime.raid_type_id == raid_type_id,
+        PlayerBestTime.scale_id == scale_id,
+        PlayerBestTime.player_id == player_id
+    ).first()
+
+
+def show_history(
+    raid_type_id: int,
+    scale_id: int,
+    player_id: int,
+    older_than: int | None = None,
+    newer_than: int | None = None
+) -> tuple[interactions.Embed, list[interactions.ActionRow]]:
+    """ Builds one page of a player's run history and its buttons. This
+        blocks, so it is run on the job queue.
+    """
+
+    with get_session() as session:
+        page = get_history_page(
+            session,
+            raid_type_id,
+            scale_id,
+            player_id,
+            older_than=older_than,
+            newer_than=newer_than
+        )
+
+        # The page the user was on may have been deleted since.
+        if not page.runs and (older_than or newer_than):
+            page = get_history_page(
+                session, raid_type_id, scale_id, player_id
+            )
+
+        raid_type = session.get(RaidType, raid_type_id)
+        scale = session.get(Scale, scale_id)
+        player = session.get(Player, player_id)
+
+        if not page.runs:
+            message = (
+                f'{player.name} does not have any {scale.identifier} runs '
+                f'in {raid_type.identifier}.'
+            )
+            return error_to_embed('No runs found', message), []
+
+        group_names = get_group_names(
+            session, list({run.player_group_id for run in page.runs})
+        )
+        embed = history_to_embed(
+            player.name,
+            raid_type.identifier,
+            scale.identifier,
+            page,
+            group_names
+        )
+
+    custom_id = f'history:{raid_type_id}:{scale_id}:{player_id}'
+    buttons = interactions.ActionRow(
+        interactions.Button(
+            style=interactions.ButtonStyle.SECONDARY,
+            label='Newer',
+            custom_id=f'{custom_id}:newer:{page.runs[0].id}',
+            disabled=not page.has_newer
+        ),
+        interactions.Button(
+            style=interactions.ButtonStyle.SECONDARY,
+            label='Older',
+            custom_id=f'{custom_id}:older:{page.runs[-1].id}',
+            disabled=not page.has_older
+        )
+    )
+
+    return embed, [buttons]
+
+
+def find_history(
+    raid_type: str, scale: int, discord_id: int, display_name: str
+) -> tuple[interactions.Embed, list[interactions.ActionRow]]:
+    """ Finds a player's runs and builds the first page of their history.
+        This blocks, so it is run on the job queue.
+    """
+
+    with get_session() as session:
+        player = session.query(Player).filter(
+            Player.discord_id == str(discord_id)
+        ).first()
+
+        raid_type = get_raid_type(session, raid_type)
+        scale = get_scale(session, scale)
+
+        raid_type_id, scale_id = raid_type.id, scale.id
+
+    if not player:
+        message = f'{display_name} has not submitted any runs.'
+        return error_to_embed('No runs found', message), []
+
+    return show_history(raid_type_id, scale_id, player.id)
+
+
+def leaderboard_buttons(
+    lb: Leaderboards, page: LeaderboardPage
+) -> interactions.ActionRow:
+    """ Returns the buttons for the pages before and after this one. Each
+        button holds the cursor and rank of the entry the next page starts
+        from.
+    """
+
+    raid_type_id = lb.get_raid_type().id
+    first_time, first_id = lb.get_cursor(page.runs[0])
+    last_time, last_id = lb.get_cursor(page.runs[-1])
+    last_rank = page.first_rank + len(page.runs) - 1
+    custom_id = (
+        f'leaderboard:{lb.MODE}:{raid_type_id}:{lb.get_scale().value}'
+    )
+
+    return interactions.ActionRow(
+        interactions.Button(
+            style=interactions.ButtonStyle.SECONDARY,
+            label='Previous',
+            custom_id=(
+                f'{custom_id}:before:{first_time}:{first_id}:'
+                f'{page.first_rank}'
+            ),
+            disabled=not page.has_previous
+        ),
+        interactions.Button(
+            style=interactions.ButtonStyle.SECONDARY,
+            label='Next',
+            custom_id=f'{custom_id}:after:{last_time}:{last_id}:{last_rank}',
+            disabled=not page.has_next
+        )
+    )
+
+
+async def show_room_pbs(
+    ctx: interactions.SlashContext,
+    raid: RaidPlugin,
+    scale: int,
+    runner: interactions.Member
+):
+    """ Displays a player's personal best for every room in a raid. """
+
+    room_time_model = raid.room_time_model
+
+    with get_session() as session:
+        # Find the player.
+        player = session.query(Player).filter(
+            Player.discord_id == str(runner.id)
+        ).first()
+
+        # Find the scale.
+        scale = session.query(Scale).filter(
+            Scale.value == scale
+        ).first()
+
+        # Find the room pbs.
+        room_pbs = session.query(room_time_model).filter(
+            room_time_model.player_id == player.id,
+            room_time_model.scale_id == scale.id,
+        ).first()
+
+        if not room_pbs:
+            message = (
+                f'{runner.display_name} does not have any room personal '
+                'bests.'
+            )
+            embed = error_to_embed('No room PBs found', message)
+            await ctx.send(embed=embed)
+            return
+
+        embed = raid.room_time_to_embed(room_pbs)
+        await ctx.send(embed=embed)
+
+
+async def delete_room_pb(
+    ctx: interactions.SlashContext,
+    raid: RaidPlugin,
+    scale: int,
+    runner: interactions.Member,
+    room: str
+):
+    """ Deletes a player's personal best for one room in a raid. """
+
+    room_time_model = raid.room_time_model
+
+    with get_session() as session:
+        # Find the scale.
+        scale = session.query(Scale).filter(
+            Scale.value == scale
+        ).first()
+
+        # Find the player.
+        player = session.query(Player).filter(
+            Player.discord_id == str(runner.id)
+        ).first()
+
+        # Find the player's personal best rooms.
+        room_pb = session.query(room_time_model).filter(
+            room_time_model.scale_id == scale.id,
+            room_time_model.player_id == player.id
+        ).first()
+
+        if not room_pb:
+            message = (
+                'The player does not have a personal best for this room.'
+            )
+            embed = error_to_embed('Deletion', message)
+            await ctx.send(embed=embed)
+            return
+
+        # Set the room time to None.
+        setattr(room_pb, room, None)
+        session.commit()
+
+        embed = confirmation_to_embed(
+            'Deletion',
+            f'PB for {room} deleted for <@{runner.id}> '
+            f'({scale.identifier} scale).'
+        )
+        await ctx.send(embed=embed)
+
+
+async def delete_all_room_pbs(
+    ctx: interactions.SlashContext,
+    raid: RaidPlugin,
+    scale: int,
+    runner: interactions.Member
+):
+    """ Deletes all of a player's room personal bests in a raid. """
+
+    room_time_model = raid.room_time_model
+
+    with get_session() as session:
+        # Find the scale.
+        scale = session.query(Scale).filter(
+            Scale.value == scale
+        ).first()
+
+        # Find the player.
+        player = session.query(Player).filter(
+            Player.discord_id == str(runner.id)
+        ).first()
+
+        # Find the player's personal best rooms.
+        room_pbs = session.query(room_time_model).filter(
+            room_time_model.scale_id == scale.id,
+            room_time_model.player_id == player.id
+        ).first()
+
+        if not room_pbs:
+            message = (
+                'The player does not have any personal bests for this scale.'
+            )
+            embed = error_to_embed('Deletion', message)
+            await ctx.send(embed=embed)
+            return
+
+        # Delete the room times.
+        session.delete(room_pbs)
+        session.commit()
+
+        embed = confirmation_to_embed(
+            'Deletion',
+            f'All room times deleted for <@{runner.id}> '
+            f'({scale.identifier} scale).'
+        )
+        await ctx.send(embed=embed)
+
+
+@interactions.listen('raw_guild_members_chunk')
+async def on_members_chunk(event: interactions.events.RawGatewayEvent):
+    # Pass the members requested when resolving runners to the resolver.
+    member_resolver.process_chunk(event.data)
+
+
+@interactions.global_autocomplete('raid_type')
+async def raid_type_autocomplete(ctx: interactions.AutocompleteContext):
+    identifiers = choice_index.search_raid_types(ctx.input_text)
+    await ctx.send(
+        choices=[
+            {'name': identifier, 'value': identifier}
+            for identifier in identifiers
+        ]
+    )
+
+
+@interactions.global_autocomplete('runners')
+async def runners_autocomplete(ctx: interactions.AutocompleteContext):
+    # Discord limits the name of a choice to 100 characters. The value is
+    # the runners' Discord IDs, which fit for a full team.
+    completions = choice_index.complete_runners(ctx.input_text)
+    await ctx.send(
+        choices=[
+            {'name': names[:100], 'value': discord_ids}
+            for names, discord_ids in completions
+        ]
+    )
 
 
 @interactions.slash_command(
@@ -59,7 +710,7 @@ cm_rooms = get_cm_rooms()
             "name": "raid_type",
             "description": "Which raid do you want to submit a time for?",
             "type": interactions.OptionType.STRING,
-            "choices": raid_choices,
+            "autocomplete": True,
             "required": True
         },
         {
@@ -75,6 +726,7 @@ cm_rooms = get_cm_rooms()
                 "Submit the names of the runner(s) (comma separated)"
             ),
             "type": interactions.OptionType.STRING,
+            "autocomplete": True,
             "required": True
         },
         {
@@ -119,6 +771,9 @@ async def submit_run(
     runners: str,
     screenshot: interactions.Attachment
 ):
+    # Respond straight away, as saving the run can take a while.
+    await ctx.defer()
+
     # Make sure image is a PNG or JPEG.
     if screenshot.content_type not in ['image/png', 'image/jpeg']:
         message = ('The image submitted is not a PNG or JPEG.')
@@ -143,84 +798,250 @@ async def submit_run(
     time_in_ticks = int(round(total_time_in_seconds / 0.6, 1))
 
     # Validate the runners submitted.
-    formatted_runners_list = await validate_runners(ctx, runners, scale)
-    if not formatted_runners_list:
+    runners_found = await validate_runners(ctx, runners, scale)
+    if not runners_found:
         return
 
-    with get_session() as session:
-        # Check if the players are in a group.
-        players = get_players_from_discord_ids(formatted_runners_list)
-        player_ids = [player.id for player in players]
-        player_group_id = get_player_group_id(player_ids)
-
-        # Check if this exact run has already been submitted.
-        run_exists = session.query(SpeedrunTime).filter(
-            RaidType.identifier == raid_type,
-            SpeedrunTime.raid_type_id == RaidType.id,
-            Scale.value == scale,
-            SpeedrunTime.scale_id == Scale.id,
-            SpeedrunTime.time == time_in_ticks,
-            SpeedrunTime.player_group_id == player_group_id
-        ).first()
-        if run_exists:
-            message = ('An identical run has already been submitted.')
-            embed = error_to_embed('Submission', message)
-            await ctx.send(embed=embed)
-            return
+    # Save the screenshot.
+    image_name = f'{screenshot.id}.{screenshot.content_type.split('/')[1]}'
+    await download_attachment(screenshot, image_name)
+
+    try:
+        response = await jobs.run(
+            save_run,
+            raid_type,
+            scale,
+            runners_found,
+            time_in_ticks,
+            image_name
+        )
+    except SubmissionError as e:
+        os.remove(os.path.join('attachments', image_name))
+        embed = error_to_embed('Submission', str(e))
+        await ctx.send(embed=embed)
+        return
+
+    await response.send(ctx, send_queue)
+
+
+@interactions.slash_command(
+    name='delete_run',
+    description='Delete a speedrun time',
+    options=[
+        {
+            "name": "raid_type",
+            "description": "Which raid do you want to delete a time for?",
+            "type": interactions.OptionType.STRING,
+            "autocomplete": True,
+            "required": True
+        },
+        {
+            "name": "scale",
+            "description": "Enter the scale of the raid",
+            "type": interactions.OptionType.INTEGER,
+            "choices": scale_choices,
+            "required": True
+        },
+        {
+            "name": "runners",
+            "description": (
+                "Enter the names of the runner(s) (comma separated)"
+            ),
+            "type": interactions.OptionType.STRING,
+            "autocomplete": True,
+            "required": True
+        },
+        {
+            "name": "minutes",
+            "description": "Enter the minutes in the time you wish to delete",
+            "type": interactions.OptionType.INTEGER,
+            "min_value": 0,
+            "max_value": 59,
+            "required": True
+        },
+        {
+            "name": "seconds",
+            "description": "Enter the seconds in the time you wish to delete",
+            "type": interactions.OptionType.INTEGER,
+            "min_value": 0,
+            "max_value": 59,
+            "required": True
+        },
+        {
+            "name": "milliseconds",
+            "description": (
+                "Enter the milliseconds in the time you wish to delete"
+            ),
+            "type": interactions.OptionType.INTEGER,
+            "min_value": 0,
+            "max_value": 8,
+            "required": True
+        }
+    ]
+)
+async def delete_run(
+    ctx: interactions.SlashContext,
+    raid_type: str,
+    scale: int,
+    runners: str,
+    minutes: int,
+    seconds: int,
+    milliseconds: int
+):
+    # Validate the time submitted.
+    total_time_in_seconds = datetime.timedelta(
+        minutes=minutes,
+        seconds=seconds,
+        milliseconds=milliseconds * 100
+    ).total_seconds()
+
+    time_in_ticks = int(round(total_time_in_seconds / 0.6, 1))
+
+    # Respond straight away, as deleting the run can take a while.
+    await ctx.defer()
+
+    try:
+        formatted_runners_list = parse_runners(runners, scale)
+        embed = await jobs.run(
+            remove_run,
+            raid_type,
+            scale,
+            formatted_runners_list,
+            time_in_ticks,
+            [f'<@{_id}>' for _id in formatted_runners_list]
+        )
+    except SubmissionError as e:
+        embed = error_to_embed('Deletion', str(e))
+
+    await ctx.send(embed=embed)
+
+
+@interactions.slash_command(
+    name='leaderboards',
+    description='Get the leaderboards for a raid',
+    options=[
+        {
+            "name": "raid_type",
+            "description": (
+                "Which raid do you want to see the leaderboards for?"
+            ),
+            "type": interactions.OptionType.STRING,
+            "autocomplete": True,
+            "required": True
+        },
+        {
+            "name": "scale",
+            "description": "Enter the scale of the raid",
+            "type": interactions.OptionType.INTEGER,
+            "choices": scale_choices,
+            "required": True
+        },
+        {
+            "name": "mode",
+            "description": "Rank teams, or each player by their best team",
+            "type": interactions.OptionType.STRING,
+            "choices": [
+                interactions.SlashCommandChoice(name='Teams', value='team'),
+                interactions.SlashCommandChoice(
+                    name='Players', value='player'
+                )
+            ],
+            "required": False
+        }
+    ]
+)
+async def leaderboards(
+    ctx: interactions.SlashContext,
+    raid_type: str,
+    scale: int,
+    mode: str = 'team'
+):
+    lb = LEADERBOARD_MODES[mode](raid_type, scale)
+
+    # The raid type is typed in, so make sure it exists.
+    if lb.get_raid_type() is None or lb.get_scale() is None:
+        embed = error_to_embed(
+            'No leaderboard found', 'No raid type found.'
+        )
+        await ctx.send(embed=embed)
+        return
+
+    page = lb.get_page()
+
+    # Check if the leaderboard exists.
+    if not page.runs:
+        embed = error_to_embed(
+            'No leaderboard found',
+            'There are no runs in this leaderboard yet.'
+        )
+        await ctx.send(embed=embed)
+        return
 
-        # Save the screenshot.
-        image_name = f'{screenshot.id}.{screenshot.content_type.split('/')[1]}'
-        await download_attachment(screenshot, image_name)
+    # Display the leaderboard in an embed.
+    embed = leaderboard_to_embed(lb, page)
+    await ctx.send(embed=embed, components=leaderboard_buttons(lb, page))
 
-        # Find the raid type ID.
-        raid = session.query(RaidType).filter(
-            RaidType.identifier == raid_type
-        ).first()
 
-        # Find the scale ID.
-        scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
+@interactions.component_callback(re.compile(r'^leaderboard:'))
+async def leaderboard_page(ctx: interactions.ComponentContext):
+    _, mode, raid_type_id, scale, direction, time, _id, rank = (
+        ctx.custom_id.split(':')
+    )
 
-        # Create a new speedrun time.
-        new_time = SpeedrunTime(
-            raid_type_id=raid.id,
-            scale_id=scale.id,
-            player_group_id=player_group_id,
-            time=time_in_ticks,
-            screenshot=image_name
+    raid_type = None
+    if snapshot is not None and snapshot.get_arrays() is not None:
+        raid_type = snapshot.get_raid_type_by_id(int(raid_type_id))
+    if raid_type is None:
+        with get_session() as session:
+            raid_type = session.query(RaidType).filter(
+                RaidType.id == int(raid_type_id)
+            ).first()
+
+    # The raid type may have been deleted since the page was shown.
+    lb = None
+    if raid_type is not None:
+        lb = LEADERBOARD_MODES[mode](raid_type.identifier, int(scale))
+    if lb is None or lb.get_raid_type() is None or lb.get_scale() is None:
+        embed = error_to_embed(
+            'No leaderboard found', 'This leaderboard no longer exists.'
         )
-        session.add(new_time)
+        await ctx.send(embed=embed, ephemeral=True)
+        return
 
-        # Commit everything.
-        session.commit()
+    cursor = (int(time), int(_id))
+    if direction == 'after':
+        page = lb.get_page(after=cursor, cursor_rank=int(rank))
+    else:
+        page = lb.get_page(before=cursor, cursor_rank=int(rank))
 
-        # Format the time for the response.
-        formatted_time = ticks_to_time_string(time_in_ticks)
-        message = (
-            f'Submitted `{formatted_time}` in {raid.identifier} with '
-            f'{scale.identifier} scale.'
-        )
-        embed = confirmation_to_embed('Submission', message)
-        await ctx.send(embed=embed)
+    # Runs may have been deleted since the page was shown, so go back to the
+    # top of the board.
+    if not page.runs:
+        page = lb.get_page()
 
-        # Display the new time.
-        embed = pb_to_embed(new_time)
-        screenshot = interactions.File(
-            f'attachments/{new_time.screenshot}'
+    if not page.runs:
+        embed = error_to_embed(
+            'No leaderboard found',
+            'There are no runs in this leaderboard yet.'
         )
-        await ctx.send(embed=embed, file=screenshot)
+        await ctx.edit_origin(embed=embed, components=[])
+        return
+
+    embed = leaderboard_to_embed(lb, page)
+    await ctx.edit_origin(
+        embed=embed, components=leaderboard_buttons(lb, page)
+    )
 
 
 @interactions.slash_command(
-    name='delete_run',
-    description='Delete a speedrun time',
+    name='rank',
+    description='Find where a team places on a leaderboard',
     options=[
         {
             "name": "raid_type",
-            "description": "Which raid do you want to delete a time for?",
+            "description": "Which raid do you want to see the rank for?",
             "type": interactions.OptionType.STRING,
-            "choices": raid_choices,
+            "autocomplete": True,
             "required": True
         },
         {
@@ -236,135 +1057,126 @@ async def submit_run(
                 "Enter the names of the runner(s) (comma separated)"
             ),
             "type": interactions.OptionType.STRING,
+            "autocomplete": True,
+            "required": True
+        }
+    ]
+)
+async def rank(
+    ctx: interactions.SlashContext,
+    raid_type: str,
+    scale: int,
+    runners: str
+):
+    # Respond straight away, as the job queue may be busy.
+    await ctx.defer()
+
+    try:
+        discord_ids = parse_runners(runners, scale)
+        embed = await jobs.run(find_rank, raid_type, scale, discord_ids)
+    except SubmissionError as e:
+        embed = error_to_embed('Rank', str(e))
+
+    await ctx.send(embed=embed)
+
+
+@interactions.slash_command(
+    name='stats',
+    description='Show statistics for the runs in a raid',
+    options=[
+        {
+            "name": "raid_type",
+            "description": "Which raid do you want to see statistics for?",
+            "type": interactions.OptionType.STRING,
+            "autocomplete": True,
             "required": True
         },
         {
-            "name": "minutes",
-            "description": "Enter the minutes in the time you wish to delete",
+            "name": "scale",
+            "description": "Enter the scale of the raid",
             "type": interactions.OptionType.INTEGER,
-            "min_value": 0,
-            "max_value": 59,
+            "choices": scale_choices,
+            "required": True
+        }
+    ]
+)
+async def stats(
+    ctx: interactions.SlashContext,
+    raid_type: str,
+    scale: int
+):
+    # Respond straight away, as loading a board's runs can take a while.
+    await ctx.defer()
+
+    try:
+        embed = await jobs.run(show_stats, raid_type, scale)
+    except SubmissionError as e:
+        embed = error_to_embed('Statistics', str(e))
+
+    await ctx.send(embed=embed)
+
+
+@interactions.slash_command(
+    name='splits',
+    description='Compare a team\'s best run with their room PBs and #1',
+    options=[
+        {
+            "name": "raid_type",
+            "description": "Which raid do you want to see the splits for?",
+            "type": interactions.OptionType.STRING,
+            "choices": [
+                choice for choice in raid_choices
+                if choice.value in RAID_PLUGINS
+            ],
             "required": True
         },
         {
-            "name": "seconds",
-            "description": "Enter the seconds in the time you wish to delete",
+            "name": "scale",
+            "description": "Enter the scale of the raid",
             "type": interactions.OptionType.INTEGER,
-            "min_value": 0,
-            "max_value": 59,
+            "choices": scale_choices,
             "required": True
         },
         {
-            "name": "milliseconds",
+            "name": "runners",
             "description": (
-                "Enter the milliseconds in the time you wish to delete"
+                "Enter the names of the runner(s) (comma separated)"
             ),
-            "type": interactions.OptionType.INTEGER,
-            "min_value": 0,
-            "max_value": 8,
+            "type": interactions.OptionType.STRING,
+            "autocomplete": True,
             "required": True
         }
     ]
 )
-async def delete_run(
+async def splits(
     ctx: interactions.SlashContext,
     raid_type: str,
     scale: int,
-    runners: str,
-    minutes: int,
-    seconds: int,
-    milliseconds: int
+    runners: str
 ):
-    # Validate the time submitted.
-    total_time_in_seconds = datetime.timedelta(
-        minutes=minutes,
-        seconds=seconds,
-        milliseconds=milliseconds * 100
-    ).total_seconds()
-
-    time_in_ticks = int(round(total_time_in_seconds / 0.6, 1))
-
-    # Sanitise the players input.
-    runners = runners.replace(' ', '').split(',')
+    # Respond straight away, as the job queue may be busy.
+    await ctx.defer()
 
-    # Make sure the runner string is formatted correctly.
-    if not is_valid_runner_list(runners):
-        message = (
-            'One or more of the runners has not been entered correctly.'
+    try:
+        discord_ids = parse_runners(runners, scale)
+        embed = await jobs.run(
+            compare_team_splits, raid_type, scale, discord_ids
         )
-        embed = error_to_embed('Deletion', message)
-        await ctx.send(embed=embed)
-        return
-
-    formatted_runners_list = format_discord_ids(runners)
-
-    players = get_players_from_discord_ids(formatted_runners_list)
-    player_ids = [player.id for player in players]
-    player_group_id = get_player_group_id(player_ids)
-
-    with get_session() as session:
-        speedruntime_found = session.query(SpeedrunTime).filter(
-            RaidType.identifier == raid_type,
-            SpeedrunTime.raid_type_id == RaidType.id,
-            Scale.value == scale,
-            SpeedrunTime.scale_id == Scale.id,
-            SpeedrunTime.time == time_in_ticks,
-            SpeedrunTime.player_group_id == player_group_id
-        ).first()
-
-        # Get the scale object to display the identifier in the message.
-        scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-
-        if speedruntime_found:
-            # Look for a CM time to delete.
-            if raid_type == 'Chambers of Xeric: Challenge Mode':
-                cm_raid_pb = session.query(CmRaidTime).filter(
-                    CmRaidTime.speedrun_time_id == speedruntime_found.id
-                ).first()
-                if cm_raid_pb:
-                    session.delete(cm_raid_pb)
-                    session.flush()
-
-            if raid_type == 'Theatre of Blood':
-                tob_raid_pb = session.query(TobRaidTime).filter(
-                    TobRaidTime.speedrun_time_id == speedruntime_found.id
-                ).first()
-                if tob_raid_pb:
-                    session.delete(tob_raid_pb)
-                    session.flush()
-
-            session.delete(speedruntime_found)
-            session.commit()
-
-            message = (
-                f'{raid_type} {scale.identifier} ({', '.join(runners)}) '
-                'deleted.'
-            )
-            embed = confirmation_to_embed('Deletion', message)
-            await ctx.send(embed=embed)
+    except SubmissionError as e:
+        embed = error_to_embed('Splits', str(e))
 
-        else:
-            message = (
-                f'{raid_type} {scale.identifier} ({', '.join(runners)}) not '
-                'found.'
-            )
-            embed = error_to_embed('Deletion', message)
-            await ctx.send(embed=embed)
+    await ctx.send(embed=embed)
 
 
 @interactions.slash_command(
-    name='leaderboards',
-    description='Get the leaderboards for a raid',
+    name='history',
+    description='List a player\'s runs in a raid, newest first',
     options=[
         {
             "name": "raid_type",
-            "description": (
-                "Which raid do you want to see the leaderboards for?"
-            ),
+            "description": "Which raid do you want to see the runs for?",
             "type": interactions.OptionType.STRING,
-            "choices": raid_choices,
+            "autocomplete": True,
             "required": True
         },
         {
@@ -373,28 +1185,53 @@ async def delete_run(
             "type": interactions.OptionType.INTEGER,
             "choices": scale_choices,
             "required": True
+        },
+        {
+            "name": "runner",
+            "description": "Enter the name of the runner",
+            "type": interactions.OptionType.USER,
+            "required": True
         }
     ]
 )
-async def leaderboards(
+async def history(
     ctx: interactions.SlashContext,
     raid_type: str,
-    scale: int
+    scale: int,
+    runner: interactions.Member
 ):
-    lb = Leaderboards(raid_type, scale)
+    # Respond straight away, as the job queue may be busy.
+    await ctx.defer()
 
-    # Check if the leaderboard exists.
-    if not lb.get_leaderboard():
-        embed = error_to_embed(
-            'No leaderboard found',
-            'There are no runs in this leaderboard yet.'
+    try:
+        embed, components = await jobs.run(
+            find_history, raid_type, scale, runner.id, runner.display_name
         )
-        await ctx.send(embed=embed)
-        return
+    except SubmissionError as e:
+        embed, components = error_to_embed('History', str(e)), []
+
+    await ctx.send(embed=embed, components=components)
 
-    # Display the leaderboard in an embed.
-    embed = leaderboard_to_embed(lb)
-    await ctx.send(embed=embed)
+
+@interactions.component_callback(re.compile(r'^history:'))
+async def history_page(ctx: interactions.ComponentContext):
+    _, raid_type_id, scale_id, player_id, direction, run_id = (
+        ctx.custom_id.split(':')
+    )
+
+    # Respond straight away, as the job queue may be busy.
+    await ctx.defer(edit_origin=True)
+
+    run_id = int(run_id)
+    embed, components = await jobs.run(
+        show_history,
+        int(raid_type_id),
+        int(scale_id),
+        int(player_id),
+        older_than=run_id if direction == 'older' else None,
+        newer_than=run_id if direction == 'newer' else None
+    )
+    await ctx.edit_origin(embed=embed, components=components)
 
 
 @interactions.slash_command(
@@ -407,7 +1244,7 @@ async def leaderboards(
                 "Which raid do you want to see the leaderboards for?"
             ),
             "type": interactions.OptionType.STRING,
-            "choices": raid_choices,
+            "autocomplete": True,
             "required": True
         },
         {
@@ -447,14 +1284,15 @@ async def pb(
             RaidType.identifier == raid_type
         ).first()
 
+        if raid_type is None or scale is None:
+            embed = error_to_embed('No PB found', 'No raid type found.')
+            await ctx.send(embed=embed)
+            return
+
         # Find the personal best.
-        speedrun_time = session.query(SpeedrunTime).join(
-            PlayerGroup, SpeedrunTime.player_group_id == PlayerGroup.id
-        ).filter(
-            SpeedrunTime.raid_type_id == raid_type.id,
-            SpeedrunTime.scale_id == scale.id,
-            PlayerGroup.player_id == player.id
-        ).order_by(SpeedrunTime.time).first()
+        speedrun_time = find_personal_best(
+            session, raid_type.id, scale.id, player.id
+        )
 
         if not speedrun_time:
             message = (
@@ -465,14 +1303,16 @@ async def pb(
             await ctx.send(embed=embed)
             return
 
-        # Check if the run is a CM raid.
-        if raid_type.identifier == 'Chambers of Xeric: Challenge Mode':
-            cm_raid_pb = session.query(CmRaidTime).filter(
-                CmRaidTime.speedrun_time_id == speedrun_time.id
+        # Show the room times if the raid has them.
+        plugin = get_raid_plugin(raid_type.identifier)
+        if plugin is not None:
+            raid_time_model = plugin.raid_time_model
+            raid_pb = session.query(raid_time_model).filter(
+                raid_time_model.speedrun_time_id == speedrun_time.id
             ).first()
-            if cm_raid_pb:
+            if raid_pb:
                 # Display the run in an embed.
-                embed = pb_cm_raid_to_embed(cm_raid_pb)
+                embed = plugin.raid_time_to_embed(raid_pb)
                 await ctx.send(embed=embed)
                 return
 
@@ -518,34 +1358,7 @@ async def pb_cm_rooms(
     scale: int,
     runner: interactions.Member
 ):
-    with get_session() as session:
-        # Find the player.
-        player = session.query(Player).filter(
-            Player.discord_id == str(runner.id)
-        ).first()
-
-        # Find the scale.
-        scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-
-        # Find the room pbs.
-        room_pbs = session.query(CmRoomTime).filter(
-            CmRoomTime.player_id == player.id,
-            CmRoomTime.scale_id == scale.id,
-        ).first()
-
-        if not room_pbs:
-            message = (
-                f'{runner.display_name} does not have any room personal '
-                'bests.'
-            )
-            embed = error_to_embed('No room PBs found', message)
-            await ctx.send(embed=embed)
-            return
-
-        embed = pb_cm_room_to_embed(room_pbs)
-        await ctx.send(embed=embed)
+    await show_room_pbs(ctx, CM, scale, runner)
 
 
 @interactions.slash_command(
@@ -574,34 +1387,7 @@ async def pb_tob_rooms(
     scale: int,
     runner: interactions.Member
 ):
-    with get_session() as session:
-        # Find the player.
-        player = session.query(Player).filter(
-            Player.discord_id == str(runner.id)
-        ).first()
-
-        # Find the scale.
-        scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-
-        # Find the room pbs.
-        room_pbs = session.query(TobRoomTime).filter(
-            TobRoomTime.player_id == player.id,
-            TobRoomTime.scale_id == scale.id,
-        ).first()
-
-        if not room_pbs:
-            message = (
-                f'{runner.display_name} does not have any room personal '
-                'bests.'
-            )
-            embed = error_to_embed('No room PBs found', message)
-            await ctx.send(embed=embed)
-            return
-
-        embed = pb_tob_room_to_embed(room_pbs)
-        await ctx.send(embed=embed)
+    await show_room_pbs(ctx, TOB, scale, runner)
 
 
 @interactions.slash_command(
@@ -614,193 +1400,49 @@ async def pb_tob_rooms(
                 "Enter the names of the runner(s) (comma separated)"
             ),
             "type": interactions.OptionType.STRING,
+            "autocomplete": True,
             "required": True
         },
         {
             "name": "room_times",
             "description": "Paste in your room times",
-            "type": interactions.OptionType.STRING,
-            "required": True
-        }
-    ]
-)
-async def submit_cm_from_clipboard(
-    ctx: interactions.SlashContext,
-    runners: str,
-    room_times: str
-):
-    # Split the string into a list before every capital letter.
-    capital_letters_at_start = r'[A-Z][^A-Z]*'
-    room_times_list = re.findall(capital_letters_at_start, room_times)
-
-    # Remove the last 6 elements as they are not useful, and remove elements
-    # that do not contain a colon.
-    clean_room_times = [x.lower() for x in room_times_list[:-6] if ':' in x]
-
-    # Strip unneeded characters.
-    clean_room_times = [
-        x.replace(' ', '').replace('|', '') for x in clean_room_times
-    ]
-
-    # Split each element into a key value pair, e.g. {'tekton': '1:04.8', ...}
-    room_times_dict = {
-        x.split(':', 1)[0]: x.split(':', 1)[1] for x in clean_room_times
-    }
-
-    if not is_valid_cm_paste(room_times_dict):
-        message = ('The room times submitted are not formatted correctly.')
-        embed = error_to_embed('Submission', message)
-        await ctx.send(embed=embed)
-        return
-
-    # Grab the scale from the string and then pop it so we do not run our time
-    # function on it.
-    scale = int(room_times_dict.pop('size'))
-
-    # Convert the times to ticks.
-    for room in room_times_dict:
-        room_times_dict[room] = time_string_to_ticks(room_times_dict[room])
-
-    # Store the total raid time and remove it from the dictionary to avoid the
-    # get and set attr running on it.
-    total_raid_time = room_times_dict.pop('completed')
-
-    with get_session() as session:
-        # Get the CoX: CM raid type.
-        raid_type = session.query(RaidType).filter(
-            RaidType.identifier == 'Chambers of Xeric: Challenge Mode'
-        ).first()
-        if not raid_type:
-            message = 'No raid type found.'
-            embed = error_to_embed('Submission', message)
-            await ctx.send(embed=embed)
-            return
-
-        # Check if the scale exists in the database.
-        raid_scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-        if not raid_scale:
-            message = 'Invalid CM scale submitted.'
-            embed = error_to_embed('Submission', message)
-            await ctx.send(embed=embed)
-            return
-
-        print(f'Room times submitted: {room_times}')
-
-        # Validate the runners submitted.
-        formatted_runners_list = await validate_runners(ctx, runners, scale)
-        if not formatted_runners_list:
-            return
-
-        # Get the group ID.
-        players = get_players_from_discord_ids(formatted_runners_list)
-        player_ids = [player.id for player in players]
-        player_group_id = get_player_group_id(player_ids)
-
-        # Add to speedrun_time table.
-        # Check if this exact run has already been submitted.
-        speedrun_time = session.query(SpeedrunTime).filter(
-            SpeedrunTime.raid_type_id == raid_type.id,
-            SpeedrunTime.scale_id == raid_scale.id,
-            SpeedrunTime.player_group_id == player_group_id,
-            SpeedrunTime.time == total_raid_time
-        ).first()
-        if not speedrun_time:
-            # Save the run to the database.
-            speedrun_time = SpeedrunTime(
-                raid_type_id=raid_type.id,
-                scale_id=raid_scale.id,
-                player_group_id=player_group_id,
-                time=total_raid_time
-            )
-            session.add(speedrun_time)
-            session.flush()
-
-        # Update individual room time PBs per player.
-        player_times = {}
-        for runner in players:
-            # Get the player's best room times.
-            best_times = session.query(CmRoomTime).filter(
-                CmRoomTime.player_id == runner.id,
-                CmRoomTime.scale_id == raid_scale.id
-            ).first()
-
-            if not best_times:
-                new_run = CmRoomTime(
-                    player_id=runner.id,
-                    scale_id=raid_scale.id,
-                    **room_times_dict
-                )
-                session.add(new_run)
-                session.flush()
-                continue
-
-            before_after = best_times.update_room_times(room_times_dict)
-            session.commit()
-
-            if len(before_after) > 0:
-                player_times[runner] = before_after
-
-        if len(player_times) > 0:
-            message = (
-                'The room times submitted have been updated for the following '
-                'rooms:\n'
-            )
+            "type": interactions.OptionType.STRING,
+            "required": True
+        }
+    ]
+)
+async def submit_cm_from_clipboard(
+    ctx: interactions.SlashContext,
+    runners: str,
+    room_times: str
+):
+    # Respond straight away, as saving the run can take a while.
+    await ctx.defer()
 
-            for runner, before_after in player_times.items():
-                for room, (before, after) in before_after.items():
-                    # If there was no time before, we can't show a before and
-                    # after.
-                    if before is None:
-                        message += (
-                            f'### {runner.name}: {room} - '
-                            f'`{ticks_to_time_string(after)}`\n'
-                        )
-                        continue
-
-                    message += (
-                        f'### {runner.name}: {room} - '
-                        f'`{ticks_to_time_string(before)}` '
-                        f'-> `{ticks_to_time_string(after)}`\n'
-                    )
-
-            embed = confirmation_to_embed('New room PB(s)', message)
-            await ctx.send(embed=embed)
+    try:
+        raid = parse_cm_paste(room_times)
+    except ParseError as e:
+        embed = error_to_embed('Submission', e.message)
+        await ctx.send(embed=embed)
+        return
 
-        # Check if the run is a PB.
-        better_run_exists = session.query(CmRaidTime).filter(
-            CmRaidTime.speedrun_time_id == speedrun_time.id,
-            CmRaidTime.completed <= total_raid_time
-        ).first()
-        if not better_run_exists:
-            new_run = CmRaidTime(
-                speedrun_time_id=speedrun_time.id,
-                completed=total_raid_time,
-                **room_times_dict
-            )
-            session.add(new_run)
-            session.commit()
-            message = (
-                f'Submitted `{ticks_to_time_string(total_raid_time)}` in CoX: '
-                f'CM with {raid_scale.identifier} scale.'
-            )
-            embed = confirmation_to_embed('Submission', message)
-            await ctx.send(embed=embed)
+    print(f'Room times submitted: {room_times}')
 
-            # Display the run in an embed.
-            embed = pb_cm_raid_to_embed(new_run)
-            await ctx.send(embed=embed)
+    # Validate the runners submitted.
+    runners_found = await validate_runners(ctx, runners, raid.scale)
+    if not runners_found:
+        return
 
-        else:
-            message = (
-                'The run submitted is not a personal best.\n'
-                'Any room times that were faster have still been updated.'
-            )
-            embed = confirmation_to_embed('Submission', message)
-            await ctx.send(embed=embed)
+    try:
+        response = await jobs.run(
+            save_raid, CM.identifier, runners_found, raid
+        )
+    except SubmissionError as e:
+        embed = error_to_embed('Submission', str(e))
+        await ctx.send(embed=embed)
+        return
 
-        session.commit()
+    await response.send(ctx, send_queue)
 
 
 @interactions.slash_command(
@@ -824,7 +1466,7 @@ async def submit_cm_from_clipboard(
             "name": "room",
             "description": "Enter the room you want to delete the PB for",
             "type": interactions.OptionType.STRING,
-            "choices": cm_rooms,
+            "choices": CM.room_choices,
             "required": True
         }
     ]
@@ -835,42 +1477,7 @@ async def delete_cm_room_pb(
     runner: interactions.Member,
     room: str
 ):
-
-    with get_session() as session:
-        # Find the scale.
-        scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-
-        # Find the player.
-        player = session.query(Player).filter(
-            Player.discord_id == str(runner.id)
-        ).first()
-
-        # Find the player's personal best rooms.
-        room_pb = session.query(CmRoomTime).filter(
-            CmRoomTime.scale_id == scale.id,
-            CmRoomTime.player_id == player.id
-        ).first()
-
-        if not room_pb:
-            message = (
-                'The player does not have a personal best for this room.'
-            )
-            embed = error_to_embed('Deletion', message)
-            await ctx.send(embed=embed)
-            return
-
-        # Set the room time to None.
-        setattr(room_pb, room, None)
-        session.commit()
-
-        embed = confirmation_to_embed(
-            'Deletion',
-            f'PB for {room} deleted for <@{runner.id}> '
-            f'({scale.identifier} scale).'
-        )
-        await ctx.send(embed=embed)
+    await delete_room_pb(ctx, CM, scale, runner, room)
 
 
 @interactions.slash_command(
@@ -897,42 +1504,7 @@ async def delete_all_cm_room_pb(
     scale: int,
     runner: interactions.Member
 ):
-
-    with get_session() as session:
-        # Find the scale.
-        scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-
-        # Find the player.
-        player = session.query(Player).filter(
-            Player.discord_id == str(runner.id)
-        ).first()
-
-        # Find the player's personal best rooms.
-        room_pbs = session.query(CmRoomTime).filter(
-            CmRoomTime.scale_id == scale.id,
-            CmRoomTime.player_id == player.id
-        ).first()
-
-        if not room_pbs:
-            message = (
-                'The player does not have any personal bests for this scale.'
-            )
-            embed = error_to_embed('Deletion', message)
-            await ctx.send(embed=embed)
-            return
-
-        # Delete the room times.
-        session.delete(room_pbs)
-        session.commit()
-
-        embed = confirmation_to_embed(
-            'Deletion',
-            f'All room times deleted for <@{runner.id}> '
-            f'({scale.identifier} scale).'
-        )
-        await ctx.send(embed=embed)
+    await delete_all_room_pbs(ctx, CM, scale, runner)
 
 
 @interactions.slash_command(
@@ -945,6 +1517,7 @@ async def delete_all_cm_room_pb(
                 "Enter the names of the runner(s) (comma separated)"
             ),
             "type": interactions.OptionType.STRING,
+            "autocomplete": True,
             "required": True
         },
         {
@@ -960,202 +1533,138 @@ async def submit_tob_from_csv(
     runners: str,
     file: interactions.Attachment
 ):
-    tobdata = await open_attachment(file)
-    scale = None
-
-    csv_ids = {
-        '1': 'scale',
-        '13': 'maiden_70',
-        '14': 'maiden_50',
-        '15': 'maiden_30',
-        '17': 'maiden',
-        '23': 'bloat',
-        '35': 'nylocas_waves',
-        '36': 'nylocas_cleanup',
-        '45': 'nylocas',
-        '52': 'sotetseg_maze1_start',
-        '53': 'sotetseg_maze1_end',
-        '54': 'sotetseg_maze2_start',
-        '55': 'sotetseg_maze2_end',
-        '57': 'sotetseg',
-        '63': 'xarpus_screech',
-        '65': 'xarpus',
-        '73': 'verzik_p1',
-        '80': 'verzik_reds',
-        '74': 'verzik_p2',
-        '76': 'verzik'
-    }
-
-    tob_times = {}
-
-    for line in tobdata.strip().splitlines():
-        parts = line.split(',')
-
-        if len(parts) < 3:
-            continue
-
-        if parts[3] not in csv_ids:
-            continue
-
-        room_type = csv_ids.get(parts[3])
-
-        if room_type == 'scale':
-            players = [x for x in parts[-5:] if x]
-            scale = len(players)
-            print(f"Scale: {scale}")
-            formatted_runners_list = await validate_runners(
-                ctx, runners, scale
-            )
-            if not formatted_runners_list:
-                break
-            continue
-
-        room_time = int(parts[4])
-        tob_times[room_type] = room_time
-
-    # Boss spawn is always 16 ticks after cleanup ends.
-    tob_times['nylocas_bossspawn'] = tob_times['nylocas_cleanup'] + 16
-
-    # Verzik p3 doesn't have an ID, so we calculate it manually.
-    tob_times['verzik_p3'] = tob_times['verzik'] - tob_times['verzik_p2']
-
-    # Calculate the total time.
-    total_raid_time = (
-        tob_times['maiden'] +
-        tob_times['bloat'] +
-        tob_times['nylocas'] +
-        tob_times['sotetseg'] +
-        tob_times['xarpus'] +
-        tob_times['verzik']
-    )
-
-    with get_session() as session:
-        raid_type = session.query(RaidType).filter(
-            RaidType.identifier == 'Theatre of Blood'
-        ).first()
-        if not raid_type:
-            message = 'No raid type found.'
-            embed = error_to_embed('Submission', message)
-            await ctx.send(embed=embed)
-            return
+    # Respond straight away, as saving the run can take a while.
+    await ctx.defer()
+
+    # Only the last valid raid in the file is submitted, so a wipe or an
+    # incomplete raid at the end of the file is skipped.
+    raid = None
+    error = None
+    async for parsed in parse_tob_csv_stream(stream_attachment_lines(file)):
+        if isinstance(parsed, ParseError):
+            error = parsed
+        else:
+            raid = parsed
 
-        scale_type = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-        if not scale_type:
-            message = 'Invalid scale submitted.'
-            embed = error_to_embed('Submission', message)
-            await ctx.send(embed=embed)
-            return
+    if raid is None:
+        message = (
+            error.message if error is not None
+            else 'No raids were found in the CSV submitted.'
+        )
+        embed = error_to_embed('Submission', message)
+        await ctx.send(embed=embed)
+        return
 
-        # Find the players in the database.
-        players = get_players_from_discord_ids(formatted_runners_list)
-        player_ids = [player.id for player in players]
-        player_group_id = get_player_group_id(player_ids)
-
-        # Add to speedrun_time table.
-        # Check if this exact run has already been submitted.
-        speedrun_time = session.query(SpeedrunTime).filter(
-            SpeedrunTime.raid_type_id == raid_type.id,
-            SpeedrunTime.scale_id == scale_type.id,
-            SpeedrunTime.player_group_id == player_group_id,
-            SpeedrunTime.time == total_raid_time
-        ).first()
-        if not speedrun_time:
-            # Save the run to the database.
-            speedrun_time = SpeedrunTime(
-                raid_type_id=raid_type.id,
-                scale_id=scale_type.id,
-                player_group_id=player_group_id,
-                time=total_raid_time
-            )
-            session.add(speedrun_time)
-            session.flush()
-
-        # Update individual room time PBs per player.
-        player_times = {}
-        for runner in players:
-            # Get the player's best room times.
-            best_times = session.query(TobRoomTime).filter(
-                TobRoomTime.player_id == runner.id,
-                TobRoomTime.scale_id == scale_type.id
-            ).first()
+    print(f'Room times submitted: {raid.room_times}')
 
-            if not best_times:
-                new_run = TobRoomTime(
-                    player_id=runner.id,
-                    scale_id=scale_type.id,
-                    **tob_times
-                )
-                session.add(new_run)
-                session.flush()
-                continue
+    # Validate the runners submitted.
+    runners_found = await validate_runners(ctx, runners, raid.scale)
+    if not runners_found:
+        return
 
-            before_after = best_times.update_room_times(tob_times)
-            session.commit()
+    try:
+        response = await jobs.run(
+            save_raid, TOB.identifier, runners_found, raid
+        )
+    except SubmissionError as e:
+        embed = error_to_embed('Submission', str(e))
+        await ctx.send(embed=embed)
+        return
 
-            if len(before_after) > 0:
-                player_times[runner] = before_after
+    await response.send(ctx, send_queue)
 
-        if len(player_times) > 0:
-            message = (
-                'The room times submitted have been updated for the following '
-                'rooms:\n'
-            )
 
-            for runner, before_after in player_times.items():
-                for room, (before, after) in before_after.items():
-                    # If there was no time before, we can't show a before and
-                    # after.
-                    if before is None:
-                        message += (
-                            f'### {runner.name}: {room} - '
-                            f'`{ticks_to_time_string(after)}`\n'
-                        )
-                        continue
-
-                    message += (
-                        f'### {runner.name}: {room} - '
-                        f'`{ticks_to_time_string(before)}` '
-                        f'-> `{ticks_to_time_string(after)}`\n'
-                    )
-
-            embed = confirmation_to_embed('New room PB(s)', message)
-            await ctx.send(embed=embed)
+@interactions.slash_command(
+    name='bulk_import',
+    description='Submit every raid in a ToB CSV or CoX paste export',
+    options=[
+        {
+            "name": "raid_type",
+            "description": "Which raid is the export for?",
+            "type": interactions.OptionType.STRING,
+            "choices": [
+                choice for choice in raid_choices
+                if choice.value in RAID_PLUGINS
+            ],
+            "required": True
+        },
+        {
+            "name": "runners",
+            "description": (
+                "Enter the names of the runner(s) (comma separated)"
+            ),
+            "type": interactions.OptionType.STRING,
+            "autocomplete": True,
+            "required": True
+        },
+        {
+            "name": "file",
+            "description": (
+                "A ToB CSV file, or a text file with one CoX paste per line"
+            ),
+            "type": interactions.OptionType.ATTACHMENT,
+            "required": True
+        }
+    ]
+)
+async def bulk_import(
+    ctx: interactions.SlashContext,
+    raid_type: str,
+    runners: str,
+    file: interactions.Attachment
+):
+    # Importing many raids can take longer than Discord waits for a response.
+    await ctx.defer()
 
-        # Check if the run is a PB.
-        better_run_exists = session.query(TobRaidTime).filter(
-            TobRaidTime.speedrun_time_id == speedrun_time.id,
-            TobRaidTime.completed <= total_raid_time
-        ).first()
-        if not better_run_exists:
-            new_run = TobRaidTime(
-                speedrun_time_id=speedrun_time.id,
-                completed=total_raid_time,
-                **tob_times
-            )
-            session.add(new_run)
-            session.commit()
-            message = (
-                f'Submitted `{ticks_to_time_string(total_raid_time)}` '
-                f'in ToB with {scale_type.identifier} scale.'
-            )
-            embed = confirmation_to_embed('Submission', message)
-            await ctx.send(embed=embed)
+    # Every raid in the export must be the same scale as the runners.
+    scale = len(runners.split(','))
+    runners_found = await validate_runners(ctx, runners, scale)
+    if not runners_found:
+        return
 
-            # Display the run in an embed.
-            embed = pb_tob_raid_to_embed(new_run)
-            await ctx.send(embed=embed)
+    try:
+        importer = await jobs.run(BulkImporter, raid_type, runners_found)
+    except SubmissionError as e:
+        embed = error_to_embed('Bulk import', str(e))
+        await ctx.send(embed=embed)
+        return
 
-        else:
-            message = (
-                'The run submitted is not a personal best.\n'
-                'Any room times that were faster have still been updated.'
-            )
-            embed = confirmation_to_embed('Submission', message)
-            await ctx.send(embed=embed)
+    # Pass the raids to the importer a batch at a time, so a large export
+    # does not queue a job for every raid.
+    raids = []
+    error = None
+    try:
+        lines = stream_attachment_lines(file)
+        async for raid in stream_raids(raid_type, lines):
+            raids.append(raid)
+            if len(raids) >= BATCH_SIZE:
+                batch, raids = raids, []
+                await jobs.run(importer.add_all, batch)
+    except Exception as e:
+        print(f'Error importing raids: {e}')
+        error = e
+
+    # Write the raids read so far, even if the import stopped early.
+    try:
+        await jobs.run(importer.add_all, raids)
+        summary = await jobs.run(importer.close)
+    except Exception as e:
+        print(f'Error importing raids: {e}')
+        embed = error_to_embed('Bulk import', f'The import failed: {e}')
+        await ctx.send(embed=embed)
+        return
 
-        session.commit()
+    message = (
+        f'Imported {summary.imported} raids in {raid_type}. Skipped '
+        f'{summary.duplicates} duplicates and {len(summary.skipped)} '
+        'invalid raids.'
+    )
+    if error is not None:
+        message = f'The import stopped early: {error}\n\n{message}'
+        embed = error_to_embed('Bulk import', message)
+    else:
+        embed = confirmation_to_embed('Bulk import', message)
+    await ctx.send(embed=embed)
 
 
 @interactions.slash_command(
@@ -1179,7 +1688,7 @@ async def submit_tob_from_csv(
             "name": "room",
             "description": "Enter the room you want to delete the PB for",
             "type": interactions.OptionType.STRING,
-            "choices": cm_rooms,
+            "choices": TOB.room_choices,
             "required": True
         }
     ]
@@ -1190,42 +1699,7 @@ async def delete_tob_room_pb(
     runner: interactions.Member,
     room: str
 ):
-
-    with get_session() as session:
-        # Find the scale.
-        scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-
-        # Find the player.
-        player = session.query(Player).filter(
-            Player.discord_id == str(runner.id)
-        ).first()
-
-        # Find the player's personal best rooms.
-        room_pb = session.query(TobRoomTime).filter(
-            TobRoomTime.scale_id == scale.id,
-            TobRoomTime.player_id == player.id
-        ).first()
-
-        if not room_pb:
-            message = (
-                'The player does not have a personal best for this room.'
-            )
-            embed = error_to_embed('Deletion', message)
-            await ctx.send(embed=embed)
-            return
-
-        # Set the room time to None.
-        setattr(room_pb, room, None)
-        session.commit()
-
-        embed = confirmation_to_embed(
-            'Deletion',
-            f'PB for {room} deleted for <@{runner.id}> '
-            f'({scale.identifier} scale).'
-        )
-        await ctx.send(embed=embed)
+    await delete_room_pb(ctx, TOB, scale, runner, room)
 
 
 @interactions.slash_command(
@@ -1252,42 +1726,7 @@ async def delete_all_tob_room_pb(
     scale: int,
     runner: interactions.Member
 ):
-
-    with get_session() as session:
-        # Find the scale.
-        scale = session.query(Scale).filter(
-            Scale.value == scale
-        ).first()
-
-        # Find the player.
-        player = session.query(Player).filter(
-            Player.discord_id == str(runner.id)
-        ).first()
-
-        # Find the player's personal best rooms.
-        room_pbs = session.query(TobRoomTime).filter(
-            TobRoomTime.scale_id == scale.id,
-            TobRoomTime.player_id == player.id
-        ).first()
-
-        if not room_pbs:
-            message = (
-                'The player does not have any personal bests for this scale.'
-            )
-            embed = error_to_embed('Deletion', message)
-            await ctx.send(embed=embed)
-            return
-
-        # Delete the room times.
-        session.delete(room_pbs)
-        session.commit()
-
-        embed = confirmation_to_embed(
-            'Deletion',
-            f'All room times deleted for <@{runner.id}> '
-            f'({scale.identifier} scale).'
-        )
-        await ctx.send(embed=embed)
+    await delete_all_room_pbs(ctx, TOB, scale, runner)
 
 
 bot.start()
@@ -0,0 +1,176 @@
+from collections import OrderedDict
+from typing import Hashable
+import asyncio
+import interactions
+import secrets
+import time
+
+
+# How long a resolved display name is used for, in seconds.
+NAME_TTL = 600
+
+# The most display names kept at once.
+MAX_NAMES = 2000
+
+# How long to wait for Discord to send the members of a chunk request.
+CHUNK_TIMEOUT = 5.0
+
+
+class NameCache():
+    """ Display names by (guild, member), dropping the least recently used
+        name when full. Names expire after a TTL, so renamed members are
+        picked up.
+    """
+
+    def __init__(self, max_size: int = MAX_NAMES, ttl: float = NAME_TTL):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._names = OrderedDict()
+
+    def get(self, key: Hashable) -> str | None:
+        entry = self._names.get(key)
+        if entry is None:
+            return None
+
+        name, expires = entry
+        if expires < time.monotonic():
+            del self._names[key]
+            return None
+
+        self._names.move_to_end(key)
+        return name
+
+    def set(self, key: Hashable, name: str) -> None:
+        self._names[key] = (name, time.monotonic() + self._ttl)
+        self._names.move_to_end(key)
+        while len(self._names) > self._max_size:
+            self._names.popitem(last=False)
+
+
+def get_member_name(member: dict) -> str:
+    """ Returns the display name of a member sent by the gateway, as
+        interactions.Member.display_name does.
+    """
+
+    user = member['user']
+
+    return member.get('nick') or user.get('global_name') or user['username']
+
+
+class MemberResolver():
+    """ Looks up the display names of members. Names come from the name
+        cache or the client's member cache when possible. All other members
+        are fetched together with one gateway chunk request, and any the
+        gateway does not return are fetched over REST.
+
+        Each chunk request is sent with a nonce, and its chunks are
+        collected by process_chunk(), which must receive every
+        GUILD_MEMBERS_CHUNK event.
+    """
+
+    def __init__(self, names: NameCache | None = None):
+        self._names = names or NameCache()
+        # The names collected so far and the future to complete, by nonce.
+        self._requests = {}
+
+    def process_chunk(self, chunk: dict) -> None:
+        """ Collects the members of a chunk sent for one of our requests.
+            Chunks for other requests are ignored.
+        """
+
+        request = self._requests.get(chunk.get('nonce'))
+        if request is None:
+            return
+
+        names, done = request
+        for member in chunk.get('members', []):
+            names[int(member['user']['id'])] = get_member_name(member)
+
+        if chunk['chunk_index'] == chunk['chunk_count'] - 1:
+            if not done.done():
+                done.set_result(None)
+
+    async def _request_members(
+        self,
+        client: interactions.Client,
+        guild: interactions.Guild,
+        discord_ids: list[int]
+    ) -> dict[int, str]:
+        nonce = secrets.token_hex(16)
+        names = {}
+        done = asyncio.get_running_loop().create_future()
+        self._requests[nonce] = (names, done)
+
+        try:
+            await client.get_guild_websocket(guild.id).request_member_chunks(
+                guild.id,
+                None,
+                limit=None,
+                user_ids=[str(discord_id) for discord_id in discord_ids],
+                nonce=nonce
+            )
+            await asyncio.wait_for(done, CHUNK_TIMEOUT)
+        except Exception as e:
+            print(f'Error requesting members from the gateway: {e}')
+        finally:
+            del self._requests[nonce]
+
+        return names
+
+    async def _fetch_members(
+        self,
+        client: interactions.Client,
+        guild: interactions.Guild,
+        discord_ids: list[int]
+    ) -> dict[int, str]:
+        names = await self._request_members(client, guild, discord_ids)
+
+        # Fetch any members the gateway did not return from the API.
+        missing = [
+            discord_id for discord_id in discord_ids
+            if discord_id not in names
+        ]
+        if missing:
+            members = await asyncio.gather(
+                *[guild.fetch_member(discord_id) for discord_id in missing]
+            )
+            names.update({
+                int(member.id): member.display_name
+                for member in members if member is not None
+            })
+
+        return names
+
+    async def resolve(
+        self,
+        client: interactions.Client,
+        guild: interactions.Guild,
+        discord_ids: list[int]
+    ) -> dict[int, str] | None:
+        """ Returns the display names of the members, or None if any of them
+            are not on the server.
+        """
+
+        names = {}
+        missing = []
+        for discord_id in discord_ids:
+            name = self._names.get((guild.id, discord_id))
+            if name is None:
+                member = guild.get_member(discord_id)
+                name = member.display_name if member else None
+
+            if name is None:
+                missing.append(discord_id)
+            else:
+                names[discord_id] = name
+
+        if missing:
+            names.update(await self._fetch_members(client, guild, missing))
+
+        if any(discord_id not in names for discord_id in discord_ids):
+            return None
+
+        for discord_id, name in names.items():
+            self._names.set((guild.id, discord_id), name)
+
+        return {discord_id: names[discord_id] for discord_id in discord_ids}
@@ -0,0 +1,76 @@
+from db import Base
+from db import engine
+from models.speedrun_time import SpeedrunTime
+from sqlalchemy import Column
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import Table
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import insert
+from sqlalchemy import select
+
+
+class BestTime(Base):
+    """ The fastest run of each group on each leaderboard, so leaderboards
+        are read from one row per team rather than from every run. Kept up
+        to date by the service layer whenever a run is saved or deleted.
+    """
+
+    __table__ = Table(
+        'best_time', Base.metadata,
+        Column('raid_type_id', Integer, primary_key=True),
+        Column('scale_id', Integer, primary_key=True),
+        Column('player_group_id', Integer, primary_key=True),
+        Column('speedrun_time_id', Integer, nullable=False, unique=True),
+        Column('time', Integer, nullable=False),
+        Index(
+            'ix_best_time_leaderboard',
+            'raid_type_id', 'scale_id', 'time', 'speedrun_time_id'
+        )
+    )
+
+
+def create_best_time_table() -> None:
+    """ Creates the best_time table if it does not exist yet, filling it
+        from the runs already submitted.
+    """
+
+    with engine.begin() as connection:
+        if inspect(connection).has_table('best_time'):
+            return
+
+        print('Creating the best_time table.')
+        BestTime.__table__.create(connection)
+
+        # Number each group's runs from fastest to slowest. Ties go to the
+        # run submitted first.
+        ranked = select(
+            SpeedrunTime.raid_type_id,
+            SpeedrunTime.scale_id,
+            SpeedrunTime.player_group_id,
+            SpeedrunTime.id,
+            SpeedrunTime.time,
+            func.row_number().over(
+                partition_by=(
+                    SpeedrunTime.raid_type_id,
+                    SpeedrunTime.scale_id,
+                    SpeedrunTime.player_group_id
+                ),
+                order_by=(SpeedrunTime.time, SpeedrunTime.id)
+            ).label('position')
+        ).subquery()
+
+        connection.execute(insert(BestTime).from_select(
+            [
+                'raid_type_id', 'scale_id', 'player_group_id',
+                'speedrun_time_id', 'time'
+            ],
+            select(
+                ranked.c.raid_type_id,
+                ranked.c.scale_id,
+                ranked.c.player_group_id,
+                ranked.c.id,
+                ranked.c.time
+            ).where(ranked.c.position == 1)
+        ))
@@ -1,29 +1,79 @@
+from cache import get_cache
 from db import get_session
+from models.best_time import BestTime
 from models.player import Player
+from models.player_best_time import PlayerBestTime
 from models.player_group import PlayerGroup
 from models.raid_type import RaidType
 from models.scale import Scale
 from models.speedrun_time import SpeedrunTime
-from sqlalchemy import func
+from sqlalchemy import Column
+from sqlalchemy import and_
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy import or_
+from sqlalchemy.orm import Query
+from typing import NamedTuple
+
+
+# The number of runs shown on each page of a leaderboard.
+PAGE_SIZE = 10
+
+
+@event.listens_for(RaidType, 'after_insert')
+@event.listens_for(RaidType, 'after_update')
+def invalidate_raid_type(mapper, connection, raid_type: RaidType) -> None:
+    """ Drops a cached raid type when its row is written, so raid types
+        added or renamed while the bot runs are found.
+    """
+
+    identifiers = {raid_type.identifier}
+    identifiers.update(inspect(raid_type).attrs.identifier.history.deleted)
+    for identifier in identifiers:
+        get_cache().invalidate(('raid_type', identifier))
+
+
+class LeaderboardPage(NamedTuple):
+    runs: list[SpeedrunTime | PlayerBestTime]
+    # The rank of the first run on the page.
+    first_rank: int
+    has_previous: bool
+    has_next: bool
 
 
 class Leaderboards():
+    """ Ranks each group by its best time. """
+
+    NAME = 'leaderboard'
+    MODE = 'team'
+
     def __init__(self, raid_type: str, scale: int):
         self._raid_type = raid_type
         self._scale = scale
 
-    def get_raid_type(self) -> RaidType:
+    def _load_raid_type(self) -> RaidType:
         with get_session() as session:
             return session.query(RaidType).filter(
                 RaidType.identifier == self._raid_type
             ).first()
 
-    def get_scale(self) -> Scale:
+    def _load_scale(self) -> Scale:
         with get_session() as session:
             return session.query(Scale).filter(
                 Scale.value == self._scale
             ).first()
 
+    # Raid types and scales are only read once. Raid types that are not
+    # found are not cached, and a raid type is dropped from the cache when
+    # its row is written.
+    def get_raid_type(self) -> RaidType:
+        return get_cache().get(
+            ('raid_type', self._raid_type), self._load_raid_type
+        )
+
+    def get_scale(self) -> Scale:
+        return get_cache().get(('scale', self._scale), self._load_scale)
+
     def get_players(self, speedrun_time: SpeedrunTime) -> list[Player]:
         with get_session() as session:
             # Find the players for this speedrun time.
@@ -44,20 +94,132 @@ class Leaderboards():
 
             return players
 
-    def get_leaderboard(self, limit: int = 10) -> list[SpeedrunTime]:
+    def get_leaderboard(self, limit: int = PAGE_SIZE) -> list[SpeedrunTime]:
+        return self.get_page(limit=limit).runs
+
+    def get_cursor(self, run: SpeedrunTime) -> tuple[int, int]:
+        """ Returns the (time, id) that orders a run on the board. """
+
+        return run.time, run.id
+
+    def get_page(
+        self,
+        after: tuple[int, int] | None = None,
+        before: tuple[int, int] | None = None,
+        cursor_rank: int = 0,
+        limit: int = PAGE_SIZE
+    ) -> LeaderboardPage:
+        """ Returns the page of runs after or before the cursor of a run on
+            the board, whose rank is cursor_rank.
+        """
+
         with get_session() as session:
-            subquery = session.query(
-                SpeedrunTime.player_group_id,
-                func.min(SpeedrunTime.time).label('best_time')
+            # Each group's best run is kept in best_time, so the board only
+            # reads one row per team.
+            query = session.query(SpeedrunTime).join(
+                BestTime, BestTime.speedrun_time_id == SpeedrunTime.id
             ).filter(
-                SpeedrunTime.raid_type_id == self.get_raid_type().id,
-                SpeedrunTime.scale_id == self.get_scale().id
-            ).group_by(SpeedrunTime.player_group_id).subquery()
+                BestTime.raid_type_id == self.get_raid_type().id,
+                BestTime.scale_id == self.get_scale().id
+            )
+
+            return get_keyset_page(
+                query,
+                BestTime.time,
+                BestTime.speedrun_time_id,
+                after,
+                before,
+                cursor_rank,
+                limit
+            )
+
+
+class IndividualLeaderboards(Leaderboards):
+    """ Ranks each player by their best time with any team. """
+
+    NAME = 'individual leaderboard'
+    MODE = 'player'
+
+    def get_players(self, best_time: PlayerBestTime) -> list[Player]:
+        with get_session() as session:
+            return session.query(Player).filter(
+                Player.id == best_time.player_id
+            ).all()
+
+    def get_cursor(self, best_time: PlayerBestTime) -> tuple[int, int]:
+        return best_time.time, best_time.player_id
+
+    def get_page(
+        self,
+        after: tuple[int, int] | None = None,
+        before: tuple[int, int] | None = None,
+        cursor_rank: int = 0,
+        limit: int = PAGE_SIZE
+    ) -> LeaderboardPage:
+        with get_session() as session:
+            query = session.query(PlayerBestTime).filter(
+                PlayerBestTime.raid_type_id == self.get_raid_type().id,
+                PlayerBestTime.scale_id == self.get_scale().id
+            )
+
+            return get_keyset_page(
+                query,
+                PlayerBestTime.time,
+                PlayerBestTime.player_id,
+                after,
+                before,
+                cursor_rank,
+                limit
+            )
+
+
+def get_keyset_page(
+    query: Query,
+    time_column: Column,
+    id_column: Column,
+    after: tuple[int, int] | None,
+    before: tuple[int, int] | None,
+    cursor_rank: int,
+    limit: int
+) -> LeaderboardPage:
+    """ Returns the page of a board after or before a (time, id) cursor.
+        Entries are ordered by (time, id), so pages are found by seeking to
+        the cursor rather than skipping rows with OFFSET.
+    """
+
+    if before is not None:
+        time, _id = before
+        query = query.filter(or_(
+            time_column < time,
+            and_(time_column == time, id_column < _id)
+        )).order_by(time_column.desc(), id_column.desc())
+    else:
+        if after is not None:
+            time, _id = after
+            query = query.filter(or_(
+                time_column > time,
+                and_(time_column == time, id_column > _id)
+            ))
+        query = query.order_by(time_column, id_column)
+
+    # Fetch one extra entry to know if there is another page.
+    runs = query.limit(limit + 1).all()
+    has_more = len(runs) > limit
+    runs = runs[:limit]
 
-            leaderboards = session.query(SpeedrunTime).join(
-                subquery,
-                (SpeedrunTime.player_group_id == subquery.c.player_group_id) &
-                (SpeedrunTime.time == subquery.c.best_time)
-            ).order_by(SpeedrunTime.time).limit(limit).all()
+    if before is not None:
+        runs.reverse()
+        return LeaderboardPage(
+            runs=runs,
+            # Without more entries before it, this is the first page.
+            first_rank=cursor_rank - len(runs) if has_more else 1,
+            has_previous=has_more,
+            has_next=True
+        )
 
-            return leaderboards
+    return LeaderboardPage(
+        runs=runs,
+        first_rank=cursor_rank + 1,
+        has_previous=after is not None,
+        has_next=has_more
+    )
@@ -0,0 +1,80 @@
+from db import Base
+from db import engine
+from models.player_group import PlayerGroup
+from models.speedrun_time import SpeedrunTime
+from sqlalchemy import Column
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import Table
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import insert
+from sqlalchemy import select
+
+
+class PlayerBestTime(Base):
+    """ The fastest run of each player on each leaderboard, with any team.
+        Kept up to date by the service layer whenever a run is saved or
+        deleted, so individual leaderboards do not have to look through
+        every group a player has been in.
+    """
+
+    __table__ = Table(
+        'player_best_time', Base.metadata,
+        Column('raid_type_id', Integer, primary_key=True),
+        Column('scale_id', Integer, primary_key=True),
+        Column('player_id', Integer, primary_key=True),
+        Column('speedrun_time_id', Integer, nullable=False, index=True),
+        Column('time', Integer, nullable=False),
+        Index(
+            'ix_player_best_time_leaderboard',
+            'raid_type_id', 'scale_id', 'time', 'player_id'
+        )
+    )
+
+
+def create_player_best_time_table() -> None:
+    """ Creates the player_best_time table if it does not exist yet, filling
+        it from the runs already submitted.
+    """
+
+    with engine.begin() as connection:
+        if inspect(connection).has_table('player_best_time'):
+            return
+
+        print('Creating the player_best_time table.')
+        PlayerBestTime.__table__.create(connection)
+
+        # Number each player's runs from fastest to slowest. Ties go to the
+        # run submitted first.
+        ranked = select(
+            SpeedrunTime.raid_type_id,
+            SpeedrunTime.scale_id,
+            PlayerGroup.player_id,
+            SpeedrunTime.id,
+            SpeedrunTime.time,
+            func.row_number().over(
+                partition_by=(
+                    SpeedrunTime.raid_type_id,
+                    SpeedrunTime.scale_id,
+                    PlayerGroup.player_id
+                ),
+                order_by=(SpeedrunTime.time, SpeedrunTime.id)
+            ).label('position')
+        ).join(
+            PlayerGroup, SpeedrunTime.player_group_id == PlayerGroup.id
+        ).subquery()
+
+        connection.execute(insert(PlayerBestTime).from_select(
+            [
+                'raid_type_id', 'scale_id', 'player_id', 'speedrun_time_id',
+                'time'
+            ],
+            select(
+                ranked.c.raid_type_id,
+                ranked.c.scale_id,
+                ranked.c.player_id,
+                ranked.c.id,
+                ranked.c.time
+            ).where(ranked.c.position == 1)
+        ))
@@ -7,6 +7,9 @@ from models.speedrun_time import SpeedrunTime
 
 
 class RaidTime():
+    # The identifier of the raid type, set by each child class.
+    RAID_TYPE: str
+
     def __init__(
         self,
         player_id: int,
@@ -21,11 +24,10 @@ class RaidTime():
             setattr(self, key, value)
 
     def get_raid_type(self) -> RaidType:
-        """Each child class of RaidTime must implement this method."""
-
-        raise NotImplementedError(
-            "This method should be implemented in subclasses."
-        )
+        with get_session() as session:
+            return session.query(RaidType).filter(
+                RaidType.identifier == self.RAID_TYPE
+            ).first()
 
     def get_scale(self) -> Scale:
         with get_session() as session:
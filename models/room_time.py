@@ -1,18 +1,93 @@
 from db import get_session
+from functools import cache
 from models.player import Player
 from models.player_group import PlayerGroup
 from models.raid_type import RaidType
 from models.scale import Scale
 from models.speedrun_time import SpeedrunTime
+import numpy as np
+
+
+# Stands in for a room without a time (NULL) in tick arrays.
+NO_TIME = -1
+
+
+def room_times_to_array(
+    room_keys: tuple[str, ...], room_times: dict[str, int | None]
+) -> np.ndarray:
+    """ Converts room times to an array of ticks in the order of room_keys.
+        Rooms without a time are set to NO_TIME.
+    """
+
+    return np.array(
+        [
+            NO_TIME if room_times.get(room) is None else room_times[room]
+            for room in room_keys
+        ],
+        dtype=np.int64
+    )
+
+
+def merge_room_times(
+    best_times: np.ndarray, new_times: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """ Merges new room times into the best room times of one or more
+        players (one row each). Returns the new best times and a mask of the
+        rooms that improved. A room improves if it has a new time and either
+        had no time before or the new time is faster.
+    """
+
+    has_new_time = new_times != NO_TIME
+    improved = has_new_time & (
+        (best_times == NO_TIME) | (new_times < best_times)
+    )
+
+    return np.where(improved, new_times, best_times), improved
+
+
+def get_room_time_changes(
+    room_keys: tuple[str, ...],
+    best_times: np.ndarray,
+    new_times: np.ndarray,
+    improved: np.ndarray
+) -> dict[str, tuple[int | None, int]]:
+    """ Returns the improved rooms of one player as (before, after) ticks.
+        Before is None if the room had no time.
+    """
+
+    return {
+        room_keys[room]: (
+            None if best_times[room] == NO_TIME else int(best_times[room]),
+            int(new_times[room])
+        )
+        for room in np.flatnonzero(improved)
+    }
 
 
 class RoomTime():
+    # The identifier of the raid type, set by each child class.
+    RAID_TYPE: str
+
     def __init__(self, player_id: int, scale_id: int, **kwargs):
         self.player_id = player_id
         self.scale_id = scale_id
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    @classmethod
+    @cache
+    def get_room_keys(cls) -> tuple[str, ...]:
+        """ The rooms of the raid, in the order of the table's columns. """
+
+        # Skip the id, player_id and scale_id columns.
+        return tuple(cls.__table__.columns.keys()[3:])
+
+    def get_room_time_array(self) -> np.ndarray:
+        room_keys = self.get_room_keys()
+        return room_times_to_array(
+            room_keys, {room: getattr(self, room) for room in room_keys}
+        )
+
     def get_scale(self) -> Scale:
         with get_session() as session:
             return session.query(Scale).filter(
@@ -26,11 +101,10 @@ class RoomTime():
             ).first()
 
     def get_raid_type(self) -> RaidType:
-        """Each child class of RoomTime must implement this method."""
-
-        raise NotImplementedError(
-            "This method should be implemented in subclasses."
-        )
+        with get_session() as session:
+            return session.query(RaidType).filter(
+                RaidType.identifier == self.RAID_TYPE
+            ).first()
 
     def get_individual_room_times(self) -> dict[str, str]:
         from util import ticks_to_time_string
@@ -61,15 +135,26 @@ class RoomTime():
                 PlayerGroup.player_id == self.get_player().id
             ).order_by(SpeedrunTime.time).first()
 
+    def compare_room_times(
+        self, new_room_times: dict[str, int]
+    ) -> dict[str, tuple[int | None, int]]:
+        """ Returns the rooms that would improve, as (before, after). """
+
+        room_keys = self.get_room_keys()
+        best_times = self.get_room_time_array()
+        new_times = room_times_to_array(room_keys, new_room_times)
+        _, improved = merge_room_times(best_times, new_times)
+
+        return get_room_time_changes(
+            room_keys, best_times, new_times, improved
+        )
+
     def update_room_times(
-        self, new_room_times: dict[str, str]
-    ) -> dict[str, str]:
-        before_after = {}
-
-        for room, new_time in new_room_times.items():
-            old_time = getattr(self, room, None)
-            if old_time is not None and (new_time < old_time):
-                setattr(self, room, new_time)
-                before_after[room] = (old_time, new_time)
+        self, new_room_times: dict[str, int]
+    ) -> dict[str, tuple[int | None, int]]:
+        before_after = self.compare_room_times(new_room_times)
+
+        for room, (_, new_time) in before_after.items():
+            setattr(self, room, new_time)
 
         return before_after
@@ -0,0 +1,309 @@
+from functools import cache
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+from typing import NamedTuple
+import re
+
+
+# Matches one 'Room name: value' entry of a CoX analytics paste, e.g.
+# 'Ice demon: 1:00.0 | '. The key stops at the first colon and the value runs
+# until the next capital letter, which starts the next entry.
+CM_PASTE_TOKEN = re.compile(r'([A-Z][^A-Z:]*):([^A-Z]*)')
+
+# Matches a game time as displayed in-game, e.g. '1:04.8'.
+GAME_TIME = re.compile(r'(\d+):(\d{1,2})\.(\d)')
+
+# Maps the event IDs in a ToB CSV export to the room they time. Event '1' marks
+# the start of a raid and lists the players in its last 5 columns.
+TOB_CSV_IDS = {
+    '1': 'scale',
+    '13': 'maiden_70',
+    '14': 'maiden_50',
+    '15': 'maiden_30',
+    '17': 'maiden',
+    '23': 'bloat',
+    '35': 'nylocas_waves',
+    '36': 'nylocas_cleanup',
+    '45': 'nylocas',
+    '52': 'sotetseg_maze1_start',
+    '53': 'sotetseg_maze1_end',
+    '54': 'sotetseg_maze2_start',
+    '55': 'sotetseg_maze2_end',
+    '57': 'sotetseg',
+    '63': 'xarpus_screech',
+    '65': 'xarpus',
+    '73': 'verzik_p1',
+    '80': 'verzik_reds',
+    '74': 'verzik_p2',
+    '76': 'verzik'
+}
+
+# The rooms which add up to the total raid time.
+TOB_TOTAL_ROOMS = (
+    'maiden', 'bloat', 'nylocas', 'sotetseg', 'xarpus', 'verzik'
+)
+
+
+class ParseError(Exception):
+    """ Raised when submitted raid data cannot be parsed.
+        `missing` and `invalid` hold the offending keys, if any.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        missing: Iterable[str] = (),
+        invalid: Iterable[str] = ()
+    ):
+        super().__init__(message)
+        self.message = message
+        self.missing = tuple(missing)
+        self.invalid = tuple(invalid)
+
+    def __reduce__(self):
+        # Keep the offending keys when sent between processes.
+        return (ParseError, (self.message, self.missing, self.invalid))
+
+
+class CmPaste(NamedTuple):
+    scale: int
+    completed: int
+    room_times: dict[str, int]
+
+
+class TobRaid(NamedTuple):
+    scale: int
+    players: list[str]
+    completed: int
+    room_times: dict[str, int]
+
+
+@cache
+def get_cm_paste_keys() -> frozenset[str]:
+    """ Returns the keys expected in a CoX analytics paste. """
+
+    from models.cm_raid_time import CmRaidTime
+
+    # Remove first 2 columns because they're just IDs. The size key is not in
+    # the DB but should be in the paste.
+    return frozenset(CmRaidTime.__table__.columns.keys()[2:] + ['size'])
+
+
+def game_time_to_ticks(game_time: str) -> int | None:
+    """ Converts a game time (e.g. '1:04.8') to ticks.
+        Returns None if the string is not a game time.
+    """
+
+    match = GAME_TIME.fullmatch(game_time)
+    if not match:
+        return None
+
+    minutes, seconds, tenths = match.groups()
+    tenths = (int(minutes) * 60 + int(seconds)) * 10 + int(tenths)
+
+    # A tick is 6 tenths of a second. Integer maths avoids float errors.
+    return (tenths + 3) // 6
+
+
+def parse_cm_paste(paste: str) -> CmPaste:
+    """ Parses the room times pasted from the CoX analytics plugin.
+        (e.g. 'Tekton: 1:04.8 | Crabs: 0:35.4 | ... Size: 5 ...')
+    """
+
+    expected_keys = get_cm_paste_keys()
+    values = {}
+    invalid = []
+
+    for match in CM_PASTE_TOKEN.finditer(paste):
+        key = match[1].replace(' ', '').lower()
+
+        # Ignore anything that is not a room, and only keep the first time a
+        # room appears.
+        if key not in expected_keys or key in values:
+            continue
+
+        value = match[2].replace(' ', '').replace('|', '')
+        if key == 'size':
+            value = int(value) if value.isdigit() else None
+        else:
+            value = game_time_to_ticks(value)
+
+        if value is None:
+            invalid.append(key)
+            continue
+
+        values[key] = value
+
+    missing = sorted(expected_keys - values.keys() - set(invalid))
+    if missing or invalid:
+        details = []
+        if missing:
+            details.append(f'Missing: {', '.join(missing)}.')
+        if invalid:
+            details.append(f'Invalid: {', '.join(invalid)}.')
+        raise ParseError(
+            'The room times submitted are not formatted correctly. '
+            + ' '.join(details),
+            missing=missing,
+            invalid=invalid
+        )
+
+    scale = values.pop('size')
+    completed = values.pop('completed')
+
+    return CmPaste(scale=scale, completed=completed, room_times=values)
+
+
+def parse_cm_pastes(pastes: Iterable[str]) -> list[CmPaste | ParseError]:
+    """ Parses a batch of CoX analytics pastes. Pastes that cannot be parsed
+        are returned as their ParseError so one bad paste does not abort the
+        rest of the batch.
+    """
+
+    results = []
+    for paste in pastes:
+        try:
+            results.append(parse_cm_paste(paste))
+        except ParseError as e:
+            results.append(e)
+
+    return results
+
+
+def parse_cm_export(lines: Iterable[str]) -> Iterator[CmPaste | ParseError]:
+    """ Yields every raid in a CoX export with one paste per line. """
+
+    for line in lines:
+        if line.strip():
+            yield from parse_cm_pastes([line])
+
+
+async def parse_cm_export_stream(
+    lines: AsyncIterable[str]
+) -> AsyncIterator[CmPaste | ParseError]:
+    """ Yields every raid in a CoX export as it is downloaded. """
+
+    async for line in lines:
+        if line.strip():
+            yield parse_cm_pastes([line])[0]
+
+
+class TobCsvParser():
+    """ Incrementally parses a ToB CSV export one line at a time.
+        Only rows with an event ID in TOB_CSV_IDS are split fully, and only
+        the raid currently being read is held in memory.
+    """
+
+    def __init__(self):
+        self._players = None
+        self._room_times = {}
+
+    def feed(self, line: str) -> TobRaid | ParseError | None:
+        """ Parses a line of the export. Returns the previous raid once the
+            start of the next one is reached.
+        """
+
+        # Only split as far as the event ID and value to skip unused rows
+        # cheaply.
+        parts = line.split(',', 5)
+        if len(parts) < 5:
+            return None
+
+        room = TOB_CSV_IDS.get(parts[3])
+        if room is None:
+            return None
+
+        if room == 'scale':
+            finished = self.close()
+            players = line.strip().split(',')[-5:]
+            self._players = [player for player in players if player]
+            return finished
+
+        try:
+            self._room_times[room] = int(parts[4])
+        except ValueError:
+            self._room_times[room] = None
+
+        return None
+
+    def close(self) -> TobRaid | ParseError | None:
+        """ Finishes the raid currently being read. """
+
+        if self._players is None and not self._room_times:
+            return None
+
+        players, room_times = self._players, self._room_times
+        self._players, self._room_times = None, {}
+
+        return build_tob_raid(players, room_times)
+
+
+def build_tob_raid(
+    players: list[str] | None, room_times: dict[str, int | None]
+) -> TobRaid | ParseError:
+    """ Validates the room times read from a CSV and adds the derived ones. """
+
+    missing = [
+        room for room in TOB_CSV_IDS.values()
+        if room != 'scale' and room not in room_times
+    ]
+    if players is None:
+        missing.insert(0, 'scale')
+    invalid = [room for room, ticks in room_times.items() if ticks is None]
+
+    if missing or invalid:
+        details = []
+        if missing:
+            details.append(f'Missing: {', '.join(missing)}.')
+        if invalid:
+            details.append(f'Invalid: {', '.join(invalid)}.')
+        return ParseError(
+            'The CSV submitted is not formatted correctly. '
+            + ' '.join(details),
+            missing=missing,
+            invalid=invalid
+        )
+
+    # Boss spawn is always 16 ticks after cleanup ends.
+    room_times['nylocas_bossspawn'] = room_times['nylocas_cleanup'] + 16
+
+    # Verzik p3 doesn't have an ID, so we calculate it manually.
+    room_times['verzik_p3'] = room_times['verzik'] - room_times['verzik_p2']
+
+    completed = sum(room_times[room] for room in TOB_TOTAL_ROOMS)
+
+    return TobRaid(
+        scale=len(players),
+        players=players,
+        completed=completed,
+        room_times=room_times
+    )
+
+
+def parse_tob_csv(lines: Iterable[str]) -> Iterator[TobRaid | ParseError]:
+    """ Yields every raid in a ToB CSV export. """
+
+    parser = TobCsvParser()
+    for line in lines:
+        raid = parser.feed(line)
+        if raid is not None:
+            yield raid
+
+    raid = parser.close()
+    if raid is not None:
+        yield raid
+
+
+async def parse_tob_csv_stream(
+    lines: AsyncIterable[str]
+) -> AsyncIterator[TobRaid | ParseError]:
+    """ Yields every raid in a ToB CSV export as it is downloaded. """
+
+    parser = TobCsvParser()
+    async for line in lines:
+        raid = parser.feed(line)
+        if raid is not None:
+            yield raid
+
+    raid = parser.close()
+    if raid is not None:
+        yield raid
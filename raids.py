@@ -0,0 +1,115 @@
+from embed import pb_raid_time_to_embed
+from embed import pb_room_time_to_embed
+from models.cm_raid_time import CmRaidTime
+from models.cm_room_time import CmRoomTime
+from models.raid_time import RaidTime
+from models.room_time import RoomTime
+from models.tob_raid_time import TobRaidTime
+from models.tob_room_time import TobRoomTime
+from parsers import CmPaste
+from parsers import ParseError
+from parsers import TOB_TOTAL_ROOMS
+from parsers import TobRaid
+from parsers import parse_cm_export
+from parsers import parse_cm_export_stream
+from parsers import parse_tob_csv
+from parsers import parse_tob_csv_stream
+from rooms import CM_RAID_ROOMS
+from rooms import CM_ROOMS
+from rooms import RoomSchema
+from rooms import TOB_RAID_ROOMS
+from rooms import TOB_ROOMS
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable
+import interactions
+
+
+Raid = CmPaste | TobRaid
+
+
+class RaidPlugin():
+    """ Everything needed to support a raid with room times: its models,
+        the parser for its exports, its rooms and how its PBs are shown.
+        Adding a raid only needs a new plugin to be registered.
+    """
+
+    def __init__(
+        self,
+        short_name: str,
+        embed_name: str,
+        raid_time_model: type[RaidTime],
+        room_time_model: type[RoomTime],
+        rooms: RoomSchema,
+        raid_rooms: RoomSchema,
+        segments: tuple[str, ...],
+        read_export: Callable[[Iterable[str]], Iterable[Raid | ParseError]],
+        stream_export: Callable[
+            [AsyncIterable[str]], AsyncIterator[Raid | ParseError]
+        ]
+    ):
+        self.identifier = raid_time_model.RAID_TYPE
+        self.short_name = short_name
+        self.embed_name = embed_name
+        self.raid_time_model = raid_time_model
+        self.room_time_model = room_time_model
+        self.rooms = rooms
+        self.raid_rooms = raid_rooms
+        # The rooms that add up to the raid's total time, used for split
+        # comparisons.
+        self.segments = segments
+        self.read_export = read_export
+        self.stream_export = stream_export
+
+        # The rooms only change with the schema, so the choices are built
+        # once.
+        self.room_choices = [
+            interactions.SlashCommandChoice(name=room.label, value=room.key)
+            for room in rooms.rooms
+        ]
+
+    def raid_time_to_embed(self, raid_pb: RaidTime) -> interactions.Embed:
+        return pb_raid_time_to_embed(self.embed_name, self.raid_rooms, raid_pb)
+
+    def room_time_to_embed(self, room_pbs: RoomTime) -> interactions.Embed:
+        return pb_room_time_to_embed(self.embed_name, self.rooms, room_pbs)
+
+
+# The raids with room times, by raid type identifier.
+RAID_PLUGINS = {}
+
+
+def register_raid(plugin: RaidPlugin) -> RaidPlugin:
+    RAID_PLUGINS[plugin.identifier] = plugin
+    return plugin
+
+
+def get_raid_plugin(identifier: str) -> RaidPlugin | None:
+    """ Returns the plugin for a raid type, or None if the raid does not
+        have room times.
+    """
+
+    return RAID_PLUGINS.get(identifier)
+
+
+CM = register_raid(RaidPlugin(
+    short_name='CoX: CM',
+    embed_name='CM',
+    raid_time_model=CmRaidTime,
+    room_time_model=CmRoomTime,
+    rooms=CM_ROOMS,
+    raid_rooms=CM_RAID_ROOMS,
+    segments=('floor1', 'floor2', 'floor3', 'olm'),
+    read_export=parse_cm_export,
+    stream_export=parse_cm_export_stream
+))
+
+TOB = register_raid(RaidPlugin(
+    short_name='ToB',
+    embed_name='ToB',
+    raid_time_model=TobRaidTime,
+    room_time_model=TobRoomTime,
+    rooms=TOB_ROOMS,
+    raid_rooms=TOB_RAID_ROOMS,
+    segments=TOB_TOTAL_ROOMS,
+    read_export=parse_tob_csv,
+    stream_export=parse_tob_csv_stream
+))
@@ -0,0 +1,139 @@
+from cache import MemoryCache
+from cache import get_cache
+from db import get_session
+from models.best_time import BestTime
+from sortedcontainers import SortedList
+from typing import NamedTuple
+import threading
+import time
+
+
+# How long a board is used for, in seconds, before it is loaded again to
+# pick up runs written outside of the bot, such as by bulk_import.py.
+BOARD_MAX_AGE = 600
+
+
+class Standing(NamedTuple):
+    rank: int
+    total: int
+    time: int
+    # The (time, player_group_id) of the groups just ahead and behind.
+    ahead: tuple[int, int] | None
+    behind: tuple[int, int] | None
+
+
+class Board():
+    """ The best time of every group on a leaderboard, kept sorted so that
+        ranks and neighbours are found by bisection in O(log n).
+    """
+
+    def __init__(self, best_times: dict[int, int]):
+        self.loaded_at = time.monotonic()
+        self._best_times = dict(best_times)
+        self._sorted = SortedList(
+            (time, player_group_id)
+            for player_group_id, time in self._best_times.items()
+        )
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def set_best_time(self, player_group_id: int, time: int | None) -> None:
+        """ Moves a group to its new best time, or removes it from the board
+            if the time is None.
+        """
+
+        old_time = self._best_times.pop(player_group_id, None)
+        if old_time is not None:
+            self._sorted.remove((old_time, player_group_id))
+
+        if time is not None:
+            self._best_times[player_group_id] = time
+            self._sorted.add((time, player_group_id))
+
+    def get_standing(self, player_group_id: int) -> Standing | None:
+        time = self._best_times.get(player_group_id)
+        if time is None:
+            return None
+
+        index = self._sorted.index((time, player_group_id))
+
+        return Standing(
+            # Groups with the same time share a rank.
+            rank=self._sorted.bisect_left((time,)) + 1,
+            total=len(self._sorted),
+            time=time,
+            ahead=self._sorted[index - 1] if index > 0 else None,
+            behind=(
+                self._sorted[index + 1]
+                if index + 1 < len(self._sorted) else None
+            )
+        )
+
+
+class Rankings():
+    """ The boards of every raid type and scale. Each board is loaded on
+        first use and then kept up to date as runs are saved and deleted,
+        by registering update() with service.add_time_listener. Boards are
+        kept in the cache, so bots sharing a cache drop boards that another
+        bot has written to. Runs written by other programs are picked up
+        once a board is older than BOARD_MAX_AGE.
+    """
+
+    def __init__(self, cache: MemoryCache | None = None):
+        self._cache = cache or get_cache()
+        self._lock = threading.Lock()
+
+    def _load(self, raid_type_id: int, scale_id: int) -> Board:
+        with get_session() as session:
+            best_times = session.query(
+                BestTime.player_group_id, BestTime.time
+            ).filter(
+                BestTime.raid_type_id == raid_type_id,
+                BestTime.scale_id == scale_id
+            ).all()
+
+            return Board(dict(best_times))
+
+    def get_standing(
+        self, raid_type_id: int, scale_id: int, player_group_id: int
+    ) -> Standing | None:
+        """ Returns where a group places on a board, or None if it has no
+            runs on it.
+        """
+
+        key = ('rankings', raid_type_id, scale_id)
+
+        with self._lock:
+            board = self._cache.get(
+                key, lambda: self._load(raid_type_id, scale_id)
+            )
+            if time.monotonic() - board.loaded_at > BOARD_MAX_AGE:
+                self._cache.invalidate(key)
+                board = self._cache.get(
+                    key, lambda: self._load(raid_type_id, scale_id)
+                )
+
+            return board.get_standing(player_group_id)
+
+    def update(
+        self, raid_type_id: int, scale_id: int, player_group_id: int
+    ) -> None:
+        """ Reloads a group's best time after one of its runs was saved or
+            deleted. Boards that have not been loaded yet are skipped.
+        """
+
+        def set_best_time(board: Board) -> None:
+            with get_session() as session:
+                best_time = session.query(BestTime.time).filter(
+                    BestTime.raid_type_id == raid_type_id,
+                    BestTime.scale_id == scale_id,
+                    BestTime.player_group_id == player_group_id
+                ).scalar()
+
+            board.set_best_time(player_group_id, best_time)
+
+        with self._lock:
+            self._cache.update(
+                ('rankings', raid_type_id, scale_id), set_best_time
+            )
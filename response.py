@@ -0,0 +1,71 @@
+import interactions
+
+
+# The most embeds Discord allows in a single message.
+MAX_EMBEDS_PER_MESSAGE = 10
+
+
+class Response():
+    """ Collects the embeds and files for a reply so they can be sent in as
+        few messages as possible, rather than one message per embed.
+    """
+
+    def __init__(self):
+        self._embeds = []
+
+    def __len__(self) -> int:
+        return len(self._embeds)
+
+    def add(
+        self,
+        embed: interactions.Embed,
+        file: interactions.File | None = None
+    ) -> 'Response':
+        """ Adds an embed, and the file it displays if it has one. """
+
+        self._embeds.append((embed, file))
+        return self
+
+    def extend(self, other: 'Response') -> 'Response':
+        """ Adds every embed from another response. """
+
+        self._embeds.extend(other._embeds)
+        return self
+
+    def to_messages(self) -> list[dict]:
+        """ Splits the embeds into messages of up to MAX_EMBEDS_PER_MESSAGE,
+            each with the files its embeds display.
+        """
+
+        messages = []
+        for start in range(0, len(self._embeds), MAX_EMBEDS_PER_MESSAGE):
+            chunk = self._embeds[start:start + MAX_EMBEDS_PER_MESSAGE]
+            message = {'embeds': [embed for embed, _ in chunk]}
+
+            files = [file for _, file in chunk if file is not None]
+            if files:
+                message['files'] = files
+
+            messages.append(message)
+
+        return messages
+
+    def split(self) -> list['Response']:
+        """ Splits the response into one response for each embed. """
+
+        return [Response().add(embed, file) for embed, file in self._embeds]
+
+    async def send(
+        self, ctx: interactions.SlashContext, send_queue=None
+    ) -> None:
+        """ Sends the response, through the send queue if one is given.
+            Every message is queued before waiting, so the queue can
+            coalesce them.
+        """
+
+        if send_queue is not None:
+            await send_queue.send(ctx, self)
+            return
+
+        for message in self.to_messages():
+            await ctx.send(**message)
@@ -0,0 +1,114 @@
+from typing import NamedTuple
+
+
+# The width of a room line in an embed, not counting the emoji.
+EMBED_LINE_LENGTH = 40
+
+OLMLET = '<:olmlet:1332766373989974037>'
+
+
+class Room(NamedTuple):
+    # The column the room's time is stored in.
+    key: str
+    label: str
+    emoji: str
+
+
+class RoomSchema():
+    """ The rooms of a raid, in the order they are shown. The start of each
+        embed line is built once, so rendering only has to pad the times.
+    """
+
+    def __init__(self, rooms: list[Room]):
+        self.rooms = tuple(rooms)
+        self.labels = {room.key: room.label for room in self.rooms}
+        self._lines = tuple(
+            (
+                room.key,
+                f'### {room.emoji} `{room.label}:',
+                EMBED_LINE_LENGTH - len(room.label)
+            )
+            for room in self.rooms
+        )
+
+    def __add__(self, rooms: list[Room]) -> 'RoomSchema':
+        return RoomSchema(list(self.rooms) + rooms)
+
+    def get_keys(self) -> tuple[str, ...]:
+        return tuple(room.key for room in self.rooms)
+
+    def render(self, times: dict[str, str]) -> str:
+        """ Formats a line for each room with its time right aligned. """
+
+        return ''.join(
+            f'{prefix}{times[key].rjust(width)}`\n'
+            for key, prefix, width in self._lines
+        )
+
+
+CM_ROOMS = RoomSchema([
+    Room('tekton', 'Tekton', '<:tektiny:1332765052792471707>'),
+    Room('crabs', 'Crabs', '<:jewelled_crab:1332766850492399718>'),
+    Room('icedemon', 'Ice Demon', '<:ice_demon:1332766691352117339>'),
+    Room('shamans', 'Shamans', '<:lizardmen:1332767026430869565>'),
+    Room('floor1', 'Floor 1', '<:slayer_helmet:1332769405276393607>'),
+    Room('vanguards', 'Vanguards', '<:Mini_vanguard:1332765436277952574>'),
+    Room('thieving', 'Thieving', '<:thieving_icon:1332765676863230003>'),
+    Room('vespula', 'Vespula', '<:vespina:1332765870963036271>'),
+    Room(
+        'tightrope', 'Tightrope', '<:keystone_crystal:1332767726510276751>'
+    ),
+    Room('floor2', 'Floor 2', '<:phoenix_necklace:1332769426734321717>'),
+    Room('guardians', 'Guardians', '<:guardian:1332767232568197191>'),
+    Room('vasa', 'Vasa', '<:vasa_minirio:1332766068455903354>'),
+    Room(
+        'mystics', 'Skeletal Mystics', '<:skeletal_mystic:1332767413036515470>'
+    ),
+    Room('muttadiles', 'Muttadiles', '<:puppadile:1332766216464498690>'),
+    Room('floor3', 'Floor 3', '<:zamorak_godsword:1332769446472847421>'),
+    Room('olmmagehandphase1', 'Olm P1 Mage Hand', OLMLET),
+    Room('olmphase1', 'Olm P1', OLMLET),
+    Room('olmmagehandphase2', 'Olm P2 Mage Hand', OLMLET),
+    Room('olmphase2', 'Olm P2', OLMLET),
+    Room('olmphase3', 'Olm P3', OLMLET),
+    Room('olmhead', 'Olm Head Phase', OLMLET),
+    Room('olm', 'Olm', OLMLET)
+])
+
+CM_RAID_ROOMS = CM_ROOMS + [
+    Room('completed', 'Total', '<:xeric_symbol:1332768391446138971>')
+]
+
+MAIDEN = '<:maiden:1408123879595184363>'
+NYLOCAS = '<:nylo:1408123939535851635>'
+SOTETSEG = '<:sote:1408123952550903928>'
+XARPUS = '<:xarp:1408123965842657330>'
+VERZIK = '<:verzik:1408123977578188800>'
+
+TOB_ROOMS = RoomSchema([
+    Room('maiden_70', 'Maiden 70s', MAIDEN),
+    Room('maiden_50', 'Maiden 50s', MAIDEN),
+    Room('maiden_30', 'Maiden 30s', MAIDEN),
+    Room('maiden', 'Maiden', MAIDEN),
+    Room('bloat', 'Bloat', '<:bloat:1408123907638169690>'),
+    Room('nylocas_waves', 'Nylocas Waves', NYLOCAS),
+    Room('nylocas_cleanup', 'Nylocas Cleanup', NYLOCAS),
+    Room('nylocas_bossspawn', 'Nylocas Boss Spawn', NYLOCAS),
+    Room('nylocas', 'Nylocas', NYLOCAS),
+    Room('sotetseg_maze1_start', 'Sotetseg Maze 1 start', SOTETSEG),
+    Room('sotetseg_maze1_end', 'Sotetseg Maze 1 end', SOTETSEG),
+    Room('sotetseg_maze2_start', 'Sotetseg Maze 2 start', SOTETSEG),
+    Room('sotetseg_maze2_end', 'Sotetseg Maze 2 end', SOTETSEG),
+    Room('sotetseg', 'Sotetseg', SOTETSEG),
+    Room('xarpus_screech', 'Xarpus Screech', XARPUS),
+    Room('xarpus', 'Xarpus', XARPUS),
+    Room('verzik_p1', 'Verzik P1', VERZIK),
+    Room('verzik_reds', 'Verzik Reds', VERZIK),
+    Room('verzik_p2', 'Verzik P2', VERZIK),
+    Room('verzik_p3', 'Verzik P3', VERZIK),
+    Room('verzik', 'Verzik', VERZIK)
+])
+
+TOB_RAID_ROOMS = TOB_ROOMS + [
+    Room('completed', 'Total', '<:scythe:1408124465828597912>')
+]
@@ -0,0 +1,260 @@
+from collections import deque
+from response import MAX_EMBEDS_PER_MESSAGE
+from response import Response
+from typing import Awaitable, Callable, Mapping
+import aiohttp
+import asyncio
+import interactions
+import time
+
+
+# Sends one message and returns the response headers, if it has them.
+Transport = Callable[
+    [interactions.SlashContext, dict], Awaitable[Mapping[str, str] | None]
+]
+
+
+async def send_with_context(
+    ctx: interactions.SlashContext, message: dict
+) -> Mapping[str, str] | None:
+    """ Sends a message through the interaction. The client handles the
+        HTTP request and its rate limits itself, so no headers are
+        returned.
+    """
+
+    await ctx.send(**message)
+    return None
+
+
+def make_http_transport(
+    base_url: str, client_session: aiohttp.ClientSession
+) -> Transport:
+    """ Returns a transport that posts messages straight to a REST API, e.g.
+        a local stand-in for Discord when testing the queue. Only the embeds
+        are sent, files are not uploaded.
+    """
+
+    async def transport(
+        ctx: interactions.SlashContext, message: dict
+    ) -> Mapping[str, str]:
+        payload = {'embeds': [embed.to_dict() for embed in message['embeds']]}
+        url = f'{base_url}/channels/{ctx.channel_id}/messages'
+        async with client_session.post(url, json=payload) as response:
+            response.raise_for_status()
+            return response.headers
+
+    return transport
+
+
+class RateLimitBucket():
+    """ Tracks a Discord rate limit bucket from the rate limit headers of
+        each response. Until a response says the bucket is used up, messages
+        are sent without waiting.
+    """
+
+    def __init__(self):
+        self._remaining = None
+        self._reset_at = 0.0
+
+    async def acquire(self) -> None:
+        """ Waits until a message can be sent in this bucket. """
+
+        if self._remaining is None:
+            return
+
+        now = time.monotonic()
+        if self._remaining <= 0 and now < self._reset_at:
+            await asyncio.sleep(self._reset_at - now)
+
+        if time.monotonic() >= self._reset_at:
+            self._remaining = None
+        else:
+            self._remaining -= 1
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        if remaining is None or reset_after is None:
+            return
+
+        self._remaining = int(remaining)
+        self._reset_at = time.monotonic() + float(reset_after)
+
+
+class _PendingResponse():
+    def __init__(self, ctx: interactions.SlashContext, response: Response):
+        self.ctx = ctx
+        self.queued_at = time.monotonic()
+        # The embeds still to send, completing `sent` once they all are.
+        self.remaining = len(response)
+        self.sent = asyncio.get_running_loop().create_future()
+
+
+class _PendingEmbed():
+    def __init__(self, pending: _PendingResponse, response: Response):
+        self.pending = pending
+        # A response holding just this embed and its file.
+        self.response = response
+
+
+class _Channel():
+    def __init__(self, max_pending: int):
+        self.pending = deque()
+        self.space = asyncio.Semaphore(max_pending)
+        self.bucket = RateLimitBucket()
+        self.worker = None
+        # Embeds waiting to be queued or sent, so the channel is only
+        # dropped once it is idle.
+        self.queued = 0
+
+
+class SendQueue():
+    """ Schedules responses per channel, so each channel's responses are
+        sent in order and within the rate limit reported by the transport.
+
+        Every embed of a response is queued before waiting on any of them,
+        and consecutive embeds for the same interaction are coalesced into
+        messages of up to MAX_EMBEDS_PER_MESSAGE. Once `max_pending` embeds
+        are waiting in a channel, handlers wait before they can queue more.
+        Channels are dropped once idle.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = 20,
+        transport: Transport = send_with_context
+    ):
+        self._max_pending = max_pending
+        self._transport = transport
+        self._channels = {}
+
+        # Metrics.
+        self._sent = 0
+        self._messages = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    async def enqueue(
+        self, ctx: interactions.SlashContext, response: Response
+    ) -> asyncio.Future:
+        """ Queues every embed of a response. Returns a future that is done
+            once they have all been sent.
+        """
+
+        pending = _PendingResponse(ctx, response)
+        if pending.remaining == 0:
+            pending.sent.set_result(None)
+            return pending.sent
+
+        channel = self._channels.get(ctx.channel_id)
+        if channel is None:
+            channel = _Channel(self._max_pending)
+            self._channels[ctx.channel_id] = channel
+        channel.queued += pending.remaining
+
+        for index, embed in enumerate(response.split()):
+            # Apply backpressure when the channel is backed up.
+            try:
+                await channel.space.acquire()
+            except BaseException:
+                channel.queued -= pending.remaining - index
+                raise
+
+            channel.pending.append(_PendingEmbed(pending, embed))
+            if channel.worker is None or channel.worker.done():
+                channel.worker = asyncio.create_task(
+                    self._work(ctx.channel_id, channel)
+                )
+
+        return pending.sent
+
+    async def send(
+        self, ctx: interactions.SlashContext, response: Response
+    ) -> None:
+        """ Queues a response and waits until it has been sent. """
+
+        await (await self.enqueue(ctx, response))
+
+    def _next_batch(self, channel: _Channel) -> list[_PendingEmbed]:
+        """ Takes the next embeds for one interaction that fit in a single
+            message. Embeds of responses that already failed are dropped.
+        """
+
+        batch = []
+        while channel.pending and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            embed = channel.pending[0]
+            if batch and embed.pending.ctx is not batch[0].pending.ctx:
+                break
+
+            channel.pending.popleft()
+            if embed.pending.sent.done():
+                self._release(channel)
+            else:
+                batch.append(embed)
+
+        return batch
+
+    def _release(self, channel: _Channel) -> None:
+        channel.queued -= 1
+        channel.space.release()
+
+    async def _work(self, channel_id: int, channel: _Channel) -> None:
+        while channel.pending:
+            batch = self._next_batch(channel)
+            if not batch:
+                continue
+
+            response = Response()
+            for embed in batch:
+                response.extend(embed.response)
+
+            try:
+                for message in response.to_messages():
+                    await channel.bucket.acquire()
+                    headers = await self._transport(
+                        batch[0].pending.ctx, message
+                    )
+                    if headers:
+                        channel.bucket.update(headers)
+                    self._messages += 1
+            except Exception as e:
+                # The handler may have stopped waiting for its response.
+                for embed in batch:
+                    if not embed.pending.sent.done():
+                        embed.pending.sent.set_exception(e)
+            else:
+                now = time.monotonic()
+                for embed in batch:
+                    pending = embed.pending
+                    pending.remaining -= 1
+                    if pending.remaining == 0 and not pending.sent.done():
+                        pending.sent.set_result(None)
+
+                    latency = now - pending.queued_at
+                    self._sent += 1
+                    self._total_latency += latency
+                    self._max_latency = max(self._max_latency, latency)
+            finally:
+                for embed in batch:
+                    self._release(channel)
+
+        if channel.queued == 0 and self._channels.get(channel_id) is channel:
+            del self._channels[channel_id]
+
+    def get_metrics(self) -> dict:
+        """ Returns the embeds queued in each channel, and how many embeds
+            were sent, in how many messages and how long they waited.
+        """
+
+        return {
+            'queued': {
+                channel_id: len(channel.pending)
+                for channel_id, channel in self._channels.items()
+            },
+            'sent': self._sent,
+            'messages': self._messages,
+            'average_latency': (
+                self._total_latency / self._sent if self._sent else 0.0
+            ),
+            'max_latency': self._max_latency
+        }
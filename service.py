@@ -0,0 +1,615 @@
+from models.best_time import BestTime
+from models.player import Player
+from models.player_best_time import PlayerBestTime
+from models.player_group import PlayerGroup
+from models.raid_time import RaidTime
+from models.raid_type import RaidType
+from models.room_time import RoomTime
+from models.room_time import get_room_time_changes
+from models.room_time import merge_room_times
+from models.room_time import room_times_to_array
+from models.scale import Scale
+from models.speedrun_time import SpeedrunTime
+from parsers import CmPaste
+from parsers import TobRaid
+from raids import get_raid_plugin
+from sqlalchemy import case
+from sqlalchemy import func
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from typing import Callable, NamedTuple
+from util import format_discord_ids
+from util import is_valid_runner_list
+import numpy as np
+
+
+# Called with the raid type ID, scale ID and player group ID of a run after
+# it has been saved or deleted.
+TimeListener = Callable[[int, int, int], None]
+
+_time_listeners = []
+
+
+def add_time_listener(listener: TimeListener) -> None:
+    """ Registers a function to call whenever a run is saved or deleted,
+        e.g. to keep an in-memory view of the leaderboards up to date.
+    """
+
+    _time_listeners.append(listener)
+
+
+def notify_time_listeners(
+    raid_type_id: int, scale_id: int, player_group_id: int
+) -> None:
+    """ Tells the listeners that a group's runs have changed. The change has
+        already been committed, so a failing listener is only logged.
+    """
+
+    for listener in _time_listeners:
+        try:
+            listener(raid_type_id, scale_id, player_group_id)
+        except Exception as e:
+            print(f'Time listener {listener} failed: {e}')
+
+
+class SubmissionError(Exception):
+    """ Raised when a submission is rejected. The message is shown to the
+        user.
+    """
+
+
+class RaidSubmission(NamedTuple):
+    speedrun_time: SpeedrunTime
+    scale: Scale
+    # The raid time saved for the run, or None if it was not a PB.
+    raid_time: RaidTime | None
+    # The rooms that improved for each player, as (before, after) ticks.
+    room_pbs: dict[Player, dict[str, tuple[int | None, int]]]
+
+
+def parse_runners(runners: str, scale: int) -> list[int]:
+    """ Parses the runners submitted by the user into Discord IDs. """
+
+    # Sanitise the players input.
+    runners = runners.replace(' ', '').split(',')
+
+    # Make sure the runner string is formatted correctly.
+    if not is_valid_runner_list(runners):
+        raise SubmissionError(
+            'One or more of the runners has not been entered correctly.'
+        )
+
+    # Remove the '<@' and '>' from the runner string.
+    formatted_runners_list = format_discord_ids(runners)
+
+    # Make sure the number of submitted runners matches the number of players
+    # for the scale.
+    if len(formatted_runners_list) != scale:
+        raise SubmissionError(
+            'The number of runners submitted does not match the scale of '
+            f'the raid. Expected {scale}, got {len(formatted_runners_list)}.'
+        )
+
+    return formatted_runners_list
+
+
+def get_raid_type(session: Session, identifier: str) -> RaidType:
+    raid_type = session.query(RaidType).filter(
+        RaidType.identifier == identifier
+    ).first()
+    if not raid_type:
+        raise SubmissionError('No raid type found.')
+
+    return raid_type
+
+
+def get_scale(session: Session, value: int) -> Scale:
+    scale = session.query(Scale).filter(
+        Scale.value == value
+    ).first()
+    if not scale:
+        raise SubmissionError('Invalid scale submitted.')
+
+    return scale
+
+
+def find_player_group_id(
+    session: Session, player_ids: list[int]
+) -> int | None:
+    """ Finds the group made up of exactly these players. """
+
+    if not player_ids:
+        return None
+
+    # The group must contain every player and nobody else.
+    return session.query(PlayerGroup.id).group_by(
+        PlayerGroup.id
+    ).having(
+        func.sum(case((PlayerGroup.player_id.in_(player_ids), 1), else_=0))
+        == len(player_ids),
+        func.count(PlayerGroup.player_id) == len(player_ids)
+    ).order_by(PlayerGroup.id).limit(1).scalar()
+
+
+def get_runners(
+    session: Session, discord_ids: list[int]
+) -> tuple[list[Player], int | None]:
+    """ Returns the players and their group ID for the submitted runners. """
+
+    players = session.query(Player).filter(
+        Player.discord_id.in_([str(discord_id) for discord_id in discord_ids])
+    ).all()
+    player_ids = [player.id for player in players]
+
+    return players, find_player_group_id(session, player_ids)
+
+
+def get_runner_names(session: Session, discord_ids: list[int]) -> dict:
+    """ Returns the names of the runners already in the database. """
+
+    players, _ = get_runners(session, discord_ids)
+
+    return {int(player.discord_id): player.name for player in players}
+
+
+def get_group_names(
+    session: Session, player_group_ids: list[int]
+) -> dict[int, list[str]]:
+    """ Returns the names of the players in each group. """
+
+    names = {player_group_id: [] for player_group_id in player_group_ids}
+    for player_group_id, name in session.query(
+        PlayerGroup.id, Player.name
+    ).join(
+        Player, PlayerGroup.player_id == Player.id
+    ).filter(
+        PlayerGroup.id.in_(player_group_ids)
+    ).order_by(Player.name):
+        names[player_group_id].append(name)
+
+    return names
+
+
+def upsert_runners(
+    session: Session, runners: dict[int, str]
+) -> tuple[list[Player], int]:
+    """ Adds any new runners, and a group for them if there is not one
+        already. Returns the players and their group ID.
+    """
+
+    players, player_group_id = get_runners(session, list(runners))
+
+    # Compare the submitted players to the database of previous players.
+    existing_ids = {int(player.discord_id) for player in players}
+
+    # Keep the names of existing players up to date with their Discord
+    # display names.
+    for player in players:
+        name = runners.get(int(player.discord_id))
+        if name and player.name != name:
+            print(f'Renaming player {player.name} to {name}.')
+            player.name = name
+
+    for discord_id, name in runners.items():
+        if discord_id in existing_ids:
+            continue
+
+        print(f'Player does not exist in the DB. Adding: {discord_id}')
+        player = Player(discord_id=str(discord_id), name=name)
+        session.add(player)
+        players.append(player)
+
+    if len(players) == len(existing_ids) and player_group_id is not None:
+        return players, player_group_id
+
+    # New players need their IDs before they can be grouped.
+    session.flush()
+
+    print('Player group does not exist. Creating new group.')
+
+    # Get a new group ID.
+    player_group_id = session.query(func.max(PlayerGroup.id)).scalar()
+    player_group_id = 1 if player_group_id is None else player_group_id + 1
+
+    # Add the players to the group.
+    for player in players:
+        print(
+            f'Adding player {player.name} ({player.id}) to group '
+            f'{player_group_id}.'
+        )
+        session.add(PlayerGroup(id=player_group_id, player_id=player.id))
+
+    session.flush()
+
+    return players, player_group_id
+
+
+def find_time(
+    session: Session,
+    raid_type: RaidType,
+    scale: Scale,
+    player_group_id: int,
+    time: int
+) -> SpeedrunTime | None:
+    """ Finds a run with this exact time by the same group. """
+
+    return session.query(SpeedrunTime).filter(
+        SpeedrunTime.raid_type_id == raid_type.id,
+        SpeedrunTime.scale_id == scale.id,
+        SpeedrunTime.player_group_id == player_group_id,
+        SpeedrunTime.time == time
+    ).first()
+
+
+def record_player_best_times(
+    session: Session, speedrun_time: SpeedrunTime
+) -> None:
+    """ Makes a new run the best time of each of its players, across all of
+        their teams, if it is faster than their current best.
+    """
+
+    player_ids = [
+        player_id for player_id, in session.query(
+            PlayerGroup.player_id
+        ).filter(
+            PlayerGroup.id == speedrun_time.player_group_id
+        )
+    ]
+    best_times = {
+        best_time.player_id: best_time
+        for best_time in session.query(PlayerBestTime).filter(
+            PlayerBestTime.raid_type_id == speedrun_time.raid_type_id,
+            PlayerBestTime.scale_id == speedrun_time.scale_id,
+            PlayerBestTime.player_id.in_(player_ids)
+        )
+    }
+
+    for player_id in player_ids:
+        best_time = best_times.get(player_id)
+        if best_time is None:
+            session.add(PlayerBestTime(
+                raid_type_id=speedrun_time.raid_type_id,
+                scale_id=speedrun_time.scale_id,
+                player_id=player_id,
+                speedrun_time_id=speedrun_time.id,
+                time=speedrun_time.time
+            ))
+        elif (
+            (speedrun_time.time, speedrun_time.id)
+            < (best_time.time, best_time.speedrun_time_id)
+        ):
+            best_time.speedrun_time_id = speedrun_time.id
+            best_time.time = speedrun_time.time
+
+
+def replace_player_best_times(
+    session: Session, raid_type_id: int, scale_id: int, speedrun_time_id: int
+) -> None:
+    """ Finds the best time of each player whose best run has been deleted,
+        from their remaining runs with any team.
+    """
+
+    for best_time in session.query(PlayerBestTime).filter(
+        PlayerBestTime.speedrun_time_id == speedrun_time_id
+    ).all():
+        best_run = session.query(SpeedrunTime).join(
+            PlayerGroup, SpeedrunTime.player_group_id == PlayerGroup.id
+        ).filter(
+            SpeedrunTime.raid_type_id == raid_type_id,
+            SpeedrunTime.scale_id == scale_id,
+            PlayerGroup.player_id == best_time.player_id
+        ).order_by(SpeedrunTime.time, SpeedrunTime.id).first()
+
+        if best_run is None:
+            session.delete(best_time)
+        else:
+            best_time.speedrun_time_id = best_run.id
+            best_time.time = best_run.time
+
+    session.flush()
+
+
+def record_best_time(session: Session, speedrun_time: SpeedrunTime) -> None:
+    """ Makes a new run its group's and its players' best time if it is the
+        fastest. The run must have been flushed so that it has an ID.
+    """
+
+    best_time = session.get(BestTime, (
+        speedrun_time.raid_type_id,
+        speedrun_time.scale_id,
+        speedrun_time.player_group_id
+    ))
+
+    if best_time is None:
+        session.add(BestTime(
+            raid_type_id=speedrun_time.raid_type_id,
+            scale_id=speedrun_time.scale_id,
+            player_group_id=speedrun_time.player_group_id,
+            speedrun_time_id=speedrun_time.id,
+            time=speedrun_time.time
+        ))
+    elif (
+        (speedrun_time.time, speedrun_time.id)
+        < (best_time.time, best_time.speedrun_time_id)
+    ):
+        best_time.speedrun_time_id = speedrun_time.id
+        best_time.time = speedrun_time.time
+
+    record_player_best_times(session, speedrun_time)
+
+    session.flush()
+
+
+def replace_best_time(
+    session: Session, raid_type_id: int, scale_id: int, player_group_id: int
+) -> None:
+    """ Finds a group's best time from its remaining runs, after its best
+        run has been deleted.
+    """
+
+    best_time = session.get(
+        BestTime, (raid_type_id, scale_id, player_group_id)
+    )
+    best_run = session.query(SpeedrunTime).filter(
+        SpeedrunTime.raid_type_id == raid_type_id,
+        SpeedrunTime.scale_id == scale_id,
+        SpeedrunTime.player_group_id == player_group_id
+    ).order_by(SpeedrunTime.time, SpeedrunTime.id).first()
+
+    if best_run is None:
+        if best_time is not None:
+            session.delete(best_time)
+    elif best_time is None:
+        session.add(BestTime(
+            raid_type_id=raid_type_id,
+            scale_id=scale_id,
+            player_group_id=player_group_id,
+            speedrun_time_id=best_run.id,
+            time=best_run.time
+        ))
+    else:
+        best_time.speedrun_time_id = best_run.id
+        best_time.time = best_run.time
+
+    session.flush()
+
+
+def submit_time(
+    session: Session,
+    raid_type: str,
+    scale: int,
+    runners: dict[int, str],
+    time: int,
+    screenshot: str | None = None
+) -> SpeedrunTime:
+    """ Saves a run that only has a total time. The runners are added with
+        the run in a single transaction.
+    """
+
+    raid = get_raid_type(session, raid_type)
+    scale = get_scale(session, scale)
+    _, player_group_id = upsert_runners(session, runners)
+
+    if find_time(session, raid, scale, player_group_id, time):
+        session.rollback()
+        raise SubmissionError('An identical run has already been submitted.')
+
+    new_time = SpeedrunTime(
+        raid_type_id=raid.id,
+        scale_id=scale.id,
+        player_group_id=player_group_id,
+        time=time,
+        screenshot=screenshot
+    )
+    session.add(new_time)
+    session.flush()
+    record_best_time(session, new_time)
+    session.commit()
+
+    notify_time_listeners(raid.id, scale.id, player_group_id)
+
+    return new_time
+
+
+def update_room_pbs(
+    session: Session,
+    room_time_model: type[RoomTime],
+    players: list[Player],
+    scale_id: int,
+    room_times: dict[str, int]
+) -> dict[Player, dict[str, tuple[int | None, int]]]:
+    """ Updates the individual room PBs of each player with the room times
+        of a run. Returns the rooms that improved for each player.
+        Existing PBs are read with one query and lowered with one UPDATE.
+    """
+
+    room_keys = room_time_model.get_room_keys()
+    room_columns = [getattr(room_time_model, room) for room in room_keys]
+
+    # Get every player's best room times at once.
+    best_times = {
+        player_id: room_times_to_array(room_keys, dict(zip(room_keys, times)))
+        for player_id, *times in session.query(
+            room_time_model.player_id, *room_columns
+        ).filter(
+            room_time_model.player_id.in_([player.id for player in players]),
+            room_time_model.scale_id == scale_id
+        )
+    }
+
+    for runner in players:
+        if runner.id not in best_times:
+            session.add(room_time_model(
+                player_id=runner.id,
+                scale_id=scale_id,
+                **room_times
+            ))
+
+    runners = [runner for runner in players if runner.id in best_times]
+    if not runners:
+        session.flush()
+        return {}
+
+    # Merge the run into every runner's PBs in one pass.
+    new_times = room_times_to_array(room_keys, room_times)
+    old_times = np.stack([best_times[runner.id] for runner in runners])
+    _, improved = merge_room_times(old_times, new_times)
+
+    player_times = {}
+    for runner, runner_times, runner_improved in zip(
+        runners, old_times, improved
+    ):
+        if runner_improved.any():
+            player_times[runner] = get_room_time_changes(
+                room_keys, runner_times, new_times, runner_improved
+            )
+
+    # Every runner gets the same room times, so one statement can lower all
+    # of their PBs. Rooms without a PB are filled in by the COALESCE.
+    improved_rooms = np.flatnonzero(improved.any(axis=0))
+    if len(improved_rooms) > 0:
+        session.execute(
+            update(room_time_model).where(
+                room_time_model.player_id.in_(best_times.keys()),
+                room_time_model.scale_id == scale_id
+            ).values({
+                room_keys[room]: func.least(
+                    func.coalesce(room_columns[room], int(new_times[room])),
+                    int(new_times[room])
+                )
+                for room in improved_rooms
+            }).execution_options(synchronize_session=False)
+        )
+
+    session.flush()
+
+    return player_times
+
+
+def submit_raid(
+    session: Session,
+    raid_type: str,
+    runners: dict[int, str],
+    raid: CmPaste | TobRaid
+) -> RaidSubmission:
+    """ Saves a run with room times, updating the runners' room PBs.
+        Adding the runners, saving the run, merging the room PBs and saving
+        the raid PB happen in a single transaction.
+    """
+
+    plugin = get_raid_plugin(raid_type)
+    if plugin is None:
+        raise SubmissionError(f'{raid_type} does not have room times.')
+    raid_time_model = plugin.raid_time_model
+
+    raid_type = get_raid_type(session, raid_type)
+    scale = get_scale(session, raid.scale)
+    players, player_group_id = upsert_runners(session, runners)
+
+    # Add to speedrun_time table unless this exact run has already been
+    # submitted.
+    speedrun_time = find_time(
+        session, raid_type, scale, player_group_id, raid.completed
+    )
+    if not speedrun_time:
+        speedrun_time = SpeedrunTime(
+            raid_type_id=raid_type.id,
+            scale_id=scale.id,
+            player_group_id=player_group_id,
+            time=raid.completed
+        )
+        session.add(speedrun_time)
+        session.flush()
+        record_best_time(session, speedrun_time)
+
+    room_pbs = update_room_pbs(
+        session, plugin.room_time_model, players, scale.id, raid.room_times
+    )
+
+    # Check if the run is a PB.
+    better_run_exists = session.query(raid_time_model).filter(
+        raid_time_model.speedrun_time_id == speedrun_time.id,
+        raid_time_model.completed <= raid.completed
+    ).first()
+
+    raid_time = None
+    if not better_run_exists:
+        raid_time = raid_time_model(
+            speedrun_time_id=speedrun_time.id,
+            completed=raid.completed,
+            **raid.room_times
+        )
+        session.add(raid_time)
+
+    session.commit()
+
+    notify_time_listeners(raid_type.id, scale.id, player_group_id)
+
+    return RaidSubmission(
+        speedrun_time=speedrun_time,
+        scale=scale,
+        raid_time=raid_time,
+        room_pbs=room_pbs
+    )
+
+
+def delete_time(
+    session: Session,
+    raid_type: str,
+    scale: int,
+    discord_ids: list[int],
+    time: int
+) -> bool:
+    """ Deletes a run and its raid times. Returns False if it was not
+        found.
+    """
+
+    _, player_group_id = get_runners(session, discord_ids)
+
+    speedruntime_found = session.query(SpeedrunTime).filter(
+        RaidType.identifier == raid_type,
+        SpeedrunTime.raid_type_id == RaidType.id,
+        Scale.value == scale,
+        SpeedrunTime.scale_id == Scale.id,
+        SpeedrunTime.time == time,
+        SpeedrunTime.player_group_id == player_group_id
+    ).first()
+    if not speedruntime_found:
+        return False
+
+    # Delete the room times saved for the run.
+    plugin = get_raid_plugin(raid_type)
+    if plugin is not None:
+        raid_time_model = plugin.raid_time_model
+        raid_pb = session.query(raid_time_model).filter(
+            raid_time_model.speedrun_time_id == speedruntime_found.id
+        ).first()
+        if raid_pb:
+            session.delete(raid_pb)
+            session.flush()
+
+    speedrun_time_id = speedruntime_found.id
+    raid_type_id = speedruntime_found.raid_type_id
+    scale_id = speedruntime_found.scale_id
+    best_time = session.get(
+        BestTime, (raid_type_id, scale_id, player_group_id)
+    )
+
+    session.delete(speedruntime_found)
+    session.flush()
+
+    # Only deleting the group's best run changes its best time.
+    if (
+        best_time is None
+        or best_time.speedrun_time_id == speedrun_time_id
+    ):
+        replace_best_time(session, raid_type_id, scale_id, player_group_id)
+    replace_player_best_times(
+        session, raid_type_id, scale_id, speedrun_time_id
+    )
+
+    session.commit()
+
+    notify_time_listeners(raid_type_id, scale_id, player_group_id)
+
+    return True
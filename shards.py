@@ -0,0 +1,66 @@
+from cache import CACHE_ADDRESS_VARIABLE
+from cache import CACHE_AUTHKEY_VARIABLE
+from cache import start_cache_server
+from models.best_time import create_best_time_table
+from models.player_best_time import create_player_best_time_table
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+# Set for each bot so it connects as its shard.
+SHARD_ID_VARIABLE = 'SPEEDRUN_SHARD_ID'
+TOTAL_SHARDS_VARIABLE = 'SPEEDRUN_TOTAL_SHARDS'
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+# Discord only lets a bot identify one shard every five seconds.
+IDENTIFY_DELAY = 5.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            'Run the bot as several gateway shards, each in its own process. '
+            'The shards share a cache server, so a run saved on one shard '
+            'updates the leaderboards of the others.'
+        )
+    )
+    parser.add_argument('shards', type=int, help='Number of shards to run')
+    args = parser.parse_args()
+
+    # Create the tables once, rather than in every shard at the same time.
+    create_best_time_table()
+    create_player_best_time_table()
+
+    (host, port), authkey = start_cache_server()
+
+    processes = []
+    try:
+        for shard_id in range(args.shards):
+            if shard_id > 0:
+                time.sleep(IDENTIFY_DELAY)
+
+            environment = dict(os.environ)
+            environment[SHARD_ID_VARIABLE] = str(shard_id)
+            environment[TOTAL_SHARDS_VARIABLE] = str(args.shards)
+            environment[CACHE_ADDRESS_VARIABLE] = f'{host}:{port}'
+            environment[CACHE_AUTHKEY_VARIABLE] = authkey.hex()
+
+            processes.append(subprocess.Popen(
+                [sys.executable, MAIN_PATH], env=environment
+            ))
+            print(f'Started shard {shard_id} of {args.shards}.')
+
+        # The cache server runs in this process, so stay up with the shards.
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
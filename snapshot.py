@@ -0,0 +1,549 @@
+from db import get_session
+from models.best_time import BestTime
+from models.leaderboards import IndividualLeaderboards
+from models.leaderboards import LeaderboardPage
+from models.leaderboards import Leaderboards
+from models.leaderboards import PAGE_SIZE
+from models.player import Player
+from models.player_best_time import PlayerBestTime
+from models.player_group import PlayerGroup
+from models.raid_type import RaidType
+from models.scale import Scale
+from sqlalchemy import select
+from typing import NamedTuple
+import config
+import json
+import numpy as np
+import os
+import threading
+import time
+
+
+SNAPSHOT_VERSION = 1
+
+# Arrays start on a multiple of this many bytes in the file.
+ALIGNMENT = 64
+
+# The fixed width arrays in a snapshot. Boards are sorted by raid type,
+# scale, time and then the id that breaks ties, like the leaderboards.
+SNAPSHOT_DTYPES = {
+    'best_time': np.dtype([
+        ('raid_type_id', '<i4'),
+        ('scale_id', '<i4'),
+        ('time', '<i4'),
+        ('speedrun_time_id', '<i8'),
+        ('player_group_id', '<i8')
+    ]),
+    'player_best_time': np.dtype([
+        ('raid_type_id', '<i4'),
+        ('scale_id', '<i4'),
+        ('time', '<i4'),
+        ('player_id', '<i8'),
+        ('speedrun_time_id', '<i8')
+    ]),
+    # Where each board starts and ends in best_time and player_best_time.
+    'best_time_boards': np.dtype([
+        ('raid_type_id', '<i4'),
+        ('scale_id', '<i4'),
+        ('start', '<i8'),
+        ('end', '<i8')
+    ]),
+    'player_best_time_boards': np.dtype([
+        ('raid_type_id', '<i4'),
+        ('scale_id', '<i4'),
+        ('start', '<i8'),
+        ('end', '<i8')
+    ]),
+    # Sorted by player group.
+    'player_group': np.dtype([
+        ('player_group_id', '<i8'),
+        ('player_id', '<i8')
+    ]),
+    # Sorted by id. Names longer than the field are cut short.
+    'player': np.dtype([
+        ('id', '<i8'),
+        ('discord_id', '<U20'),
+        ('name', '<U32')
+    ]),
+    'raid_type': np.dtype([
+        ('id', '<i4'),
+        ('identifier', '<U64')
+    ]),
+    'scale': np.dtype([
+        ('id', '<i4'),
+        ('value', '<i4'),
+        ('identifier', '<U32')
+    ])
+}
+
+
+class SnapshotRun(NamedTuple):
+    id: int
+    time: int
+    player_group_id: int
+
+
+class SnapshotPlayerBest(NamedTuple):
+    player_id: int
+    time: int
+    speedrun_time_id: int
+
+
+class SnapshotPlayer(NamedTuple):
+    id: int
+    discord_id: str
+    name: str
+
+
+class SnapshotRaidType(NamedTuple):
+    id: int
+    identifier: str
+
+
+class SnapshotScale(NamedTuple):
+    id: int
+    value: int
+    identifier: str
+
+
+def get_board_index(rows: np.ndarray) -> np.ndarray:
+    """ Returns where each (raid type, scale) board starts and ends in rows
+        sorted by raid type and scale.
+    """
+
+    dtype = SNAPSHOT_DTYPES['best_time_boards']
+    if len(rows) == 0:
+        return np.empty(0, dtype=dtype)
+
+    boards = np.column_stack((rows['raid_type_id'], rows['scale_id']))
+    starts = np.flatnonzero(
+        np.r_[True, np.any(boards[1:] != boards[:-1], axis=1)]
+    )
+
+    index = np.empty(len(starts), dtype=dtype)
+    index['raid_type_id'] = rows['raid_type_id'][starts]
+    index['scale_id'] = rows['scale_id'][starts]
+    index['start'] = starts
+    index['end'] = np.r_[starts[1:], len(rows)]
+
+    return index
+
+
+def load_snapshot_arrays() -> dict[str, np.ndarray]:
+    """ Reads the boards, group memberships, players, raid types and scales
+        from the database into the arrays of a snapshot.
+    """
+
+    queries = {
+        'best_time': select(
+            BestTime.raid_type_id,
+            BestTime.scale_id,
+            BestTime.time,
+            BestTime.speedrun_time_id,
+            BestTime.player_group_id
+        ).order_by(
+            BestTime.raid_type_id,
+            BestTime.scale_id,
+            BestTime.time,
+            BestTime.speedrun_time_id
+        ),
+        'player_best_time': select(
+            PlayerBestTime.raid_type_id,
+            PlayerBestTime.scale_id,
+            PlayerBestTime.time,
+            PlayerBestTime.player_id,
+            PlayerBestTime.speedrun_time_id
+        ).order_by(
+            PlayerBestTime.raid_type_id,
+            PlayerBestTime.scale_id,
+            PlayerBestTime.time,
+            PlayerBestTime.player_id
+        ),
+        'player_group': select(
+            PlayerGroup.id, PlayerGroup.player_id
+        ).order_by(PlayerGroup.id, PlayerGroup.player_id),
+        'player': select(
+            Player.id, Player.discord_id, Player.name
+        ).order_by(Player.id),
+        'raid_type': select(RaidType.id, RaidType.identifier),
+        'scale': select(Scale.id, Scale.value, Scale.identifier)
+    }
+
+    # Read every table in one transaction so the arrays agree.
+    arrays = {}
+    with get_session() as session:
+        for name, query in queries.items():
+            arrays[name] = np.array(
+                [tuple(row) for row in session.execute(query)],
+                dtype=SNAPSHOT_DTYPES[name]
+            )
+
+    arrays['best_time_boards'] = get_board_index(arrays['best_time'])
+    arrays['player_best_time_boards'] = get_board_index(
+        arrays['player_best_time']
+    )
+
+    return arrays
+
+
+def write_snapshot(path: str) -> None:
+    """ Writes a new snapshot and moves it over the old one, so readers
+        never see a partly written file.
+    """
+
+    arrays = load_snapshot_arrays()
+
+    # Lay the arrays out one after another after the header.
+    offsets = {}
+    offset = 0
+    for name, array in arrays.items():
+        offsets[name] = (offset, len(array))
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = json.dumps(
+        {'version': SNAPSHOT_VERSION, 'arrays': offsets}
+    ).encode()
+    data_start = -(-(8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(np.array(len(header), dtype='<u8').tobytes())
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(data_start + offsets[name][0])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path: str) -> dict[str, np.ndarray]:
+    """ Maps a snapshot into memory. The arrays are read only views of the
+        file, so processes reading the same snapshot share its pages.
+    """
+
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    header_length = int(buffer[:8].view('<u8')[0])
+    header = json.loads(bytes(buffer[8:8 + header_length]))
+    if header['version'] != SNAPSHOT_VERSION:
+        raise ValueError(
+            f'{path} is not a version {SNAPSHOT_VERSION} snapshot.'
+        )
+
+    data_start = -(-(8 + header_length) // ALIGNMENT) * ALIGNMENT
+    arrays = {}
+    for name, (offset, length) in header['arrays'].items():
+        dtype = SNAPSHOT_DTYPES[name]
+        start = data_start + offset
+        arrays[name] = buffer[start:start + length * dtype.itemsize].view(
+            dtype
+        )
+
+    return arrays
+
+
+def get_snapshot_page(
+    rows: np.ndarray,
+    id_field: str,
+    after: tuple[int, int] | None,
+    before: tuple[int, int] | None,
+    limit: int
+) -> tuple[np.ndarray, int, bool, bool]:
+    """ Returns the rows of a board after or before a (time, id) cursor,
+        with the rank of the first row and whether there are rows before
+        and after them. Rows are found by bisection, since a board is
+        sorted by (time, id).
+    """
+
+    times = rows['time']
+    ids = rows[id_field]
+
+    def find(cursor: tuple[int, int], side: str) -> int:
+        time, _id = cursor
+        start = np.searchsorted(times, time, 'left')
+        end = np.searchsorted(times, time, 'right')
+
+        return int(start + np.searchsorted(ids[start:end], _id, side))
+
+    if before is not None:
+        end = find(before, 'left')
+        start = max(end - limit, 0)
+    else:
+        start = find(after, 'right') if after is not None else 0
+        end = min(start + limit, len(rows))
+
+    return rows[start:end], start + 1, start > 0, end < len(rows)
+
+
+class Snapshot():
+    """ A read only snapshot of the leaderboards, kept in a file written by
+        SnapshotWriter. The file is mapped again whenever it is replaced.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._arrays = None
+        self._file_id = None
+        self._lock = threading.Lock()
+
+    def get_arrays(self) -> dict[str, np.ndarray] | None:
+        """ Returns the arrays of the latest snapshot, or None if no
+            snapshot has been written yet.
+        """
+
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            file_id = (stat.st_ino, stat.st_mtime_ns)
+            if file_id != self._file_id:
+                self._arrays = read_snapshot(self._path)
+                self._file_id = file_id
+
+            return self._arrays
+
+    def get_raid_type(self, identifier: str) -> SnapshotRaidType | None:
+        raid_types = self.get_arrays()['raid_type']
+        rows = raid_types[raid_types['identifier'] == identifier]
+        if len(rows) == 0:
+            return None
+
+        return SnapshotRaidType(int(rows[0]['id']), str(rows[0]['identifier']))
+
+    def get_raid_type_by_id(self, _id: int) -> SnapshotRaidType | None:
+        raid_types = self.get_arrays()['raid_type']
+        rows = raid_types[raid_types['id'] == _id]
+        if len(rows) == 0:
+            return None
+
+        return SnapshotRaidType(int(rows[0]['id']), str(rows[0]['identifier']))
+
+    def get_scale(self, value: int) -> SnapshotScale | None:
+        scales = self.get_arrays()['scale']
+        rows = scales[scales['value'] == value]
+        if len(rows) == 0:
+            return None
+
+        return SnapshotScale(
+            int(rows[0]['id']), int(rows[0]['value']),
+            str(rows[0]['identifier'])
+        )
+
+    def get_players(self, player_ids: np.ndarray) -> list[SnapshotPlayer]:
+        players = self.get_arrays()['player']
+        positions = np.searchsorted(players['id'], player_ids)
+        positions = positions[positions < len(players)]
+        rows = players[positions]
+        rows = rows[np.isin(rows['id'], player_ids)]
+
+        return [
+            SnapshotPlayer(
+                int(row['id']), str(row['discord_id']), str(row['name'])
+            )
+            for row in rows
+        ]
+
+    def get_group_players(self, player_group_id: int) -> list[SnapshotPlayer]:
+        members = self.get_arrays()['player_group']
+        groups = members['player_group_id']
+        start = np.searchsorted(groups, player_group_id, 'left')
+        end = np.searchsorted(groups, player_group_id, 'right')
+
+        return self.get_players(members['player_id'][start:end])
+
+    def get_board(
+        self, table: str, raid_type_id: int, scale_id: int
+    ) -> np.ndarray:
+        """ Returns the rows of one board of best_time or player_best_time. """
+
+        arrays = self.get_arrays()
+        boards = arrays[f'{table}_boards']
+        board = boards[
+            (boards['raid_type_id'] == raid_type_id) &
+            (boards['scale_id'] == scale_id)
+        ]
+        if len(board) == 0:
+            return arrays[table][:0]
+
+        return arrays[table][board[0]['start']:board[0]['end']]
+
+    def get_player_best_id(
+        self, raid_type_id: int, scale_id: int, player_id: int
+    ) -> int | None:
+        """ Returns the id of a player's fastest run on a board. """
+
+        board = self.get_board('player_best_time', raid_type_id, scale_id)
+        rows = board[board['player_id'] == player_id]
+        if len(rows) == 0:
+            return None
+
+        return int(rows[0]['speedrun_time_id'])
+
+
+class SnapshotWriter():
+    """ Writes the snapshot again after runs are saved or deleted. Writes
+        that come close together are covered by one snapshot, written on a
+        background thread by registering update() with
+        service.add_time_listener.
+    """
+
+    def __init__(self, path: str, delay: float = 1.0):
+        self._path = path
+        self._delay = delay
+        self._changed = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _work(self) -> None:
+        while True:
+            self._changed.wait()
+            # Let the rest of a batch of writes land first.
+            time.sleep(self._delay)
+            self._changed.clear()
+
+            try:
+                write_snapshot(self._path)
+            except Exception as e:
+                print(f'Error writing the snapshot: {e}')
+
+    def update(
+        self, raid_type_id: int, scale_id: int, player_group_id: int
+    ) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, daemon=True)
+                self._thread.start()
+
+        self._changed.set()
+
+
+class SnapshotLeaderboards(Leaderboards):
+    """ Ranks each group by its best time, read from a snapshot rather than
+        the database. Falls back to the database until the first snapshot
+        is written.
+    """
+
+    def __init__(self, raid_type: str, scale: int, snapshot: Snapshot):
+        super().__init__(raid_type, scale)
+        self._snapshot = snapshot
+
+    def get_raid_type(self) -> RaidType | SnapshotRaidType:
+        if self._snapshot.get_arrays() is None:
+            return super().get_raid_type()
+
+        return self._snapshot.get_raid_type(self._raid_type)
+
+    def get_scale(self) -> Scale | SnapshotScale:
+        if self._snapshot.get_arrays() is None:
+            return super().get_scale()
+
+        return self._snapshot.get_scale(self._scale)
+
+    def get_players(self, run: SnapshotRun) -> list[SnapshotPlayer]:
+        if self._snapshot.get_arrays() is None:
+            return super().get_players(run)
+
+        return self._snapshot.get_group_players(run.player_group_id)
+
+    def get_page(
+        self,
+        after: tuple[int, int] | None = None,
+        before: tuple[int, int] | None = None,
+        cursor_rank: int = 0,
+        limit: int = PAGE_SIZE
+    ) -> LeaderboardPage:
+        if self._snapshot.get_arrays() is None:
+            return super().get_page(after, before, cursor_rank, limit)
+
+        raid_type = self.get_raid_type()
+        scale = self.get_scale()
+        if raid_type is None or scale is None:
+            return LeaderboardPage([], 1, False, False)
+
+        rows, first_rank, has_previous, has_next = get_snapshot_page(
+            self._snapshot.get_board('best_time', raid_type.id, scale.id),
+            'speedrun_time_id',
+            after,
+            before,
+            limit
+        )
+
+        return LeaderboardPage(
+            runs=[
+                SnapshotRun(
+                    int(row['speedrun_time_id']), int(row['time']),
+                    int(row['player_group_id'])
+                )
+                for row in rows
+            ],
+            first_rank=first_rank,
+            has_previous=has_previous,
+            has_next=has_next
+        )
+
+
+class SnapshotIndividualLeaderboards(
+    SnapshotLeaderboards, IndividualLeaderboards
+):
+    """ Ranks each player by their best time with any team, read from a
+        snapshot rather than the database.
+    """
+
+    def get_players(
+        self, best_time: SnapshotPlayerBest
+    ) -> list[SnapshotPlayer]:
+        if self._snapshot.get_arrays() is None:
+            return IndividualLeaderboards.get_players(self, best_time)
+
+        return self._snapshot.get_players(np.array([best_time.player_id]))
+
+    def get_page(
+        self,
+        after: tuple[int, int] | None = None,
+        before: tuple[int, int] | None = None,
+        cursor_rank: int = 0,
+        limit: int = PAGE_SIZE
+    ) -> LeaderboardPage:
+        if self._snapshot.get_arrays() is None:
+            return IndividualLeaderboards.get_page(
+                self, after, before, cursor_rank, limit
+            )
+
+        raid_type = self.get_raid_type()
+        scale = self.get_scale()
+        if raid_type is None or scale is None:
+            return LeaderboardPage([], 1, False, False)
+
+        rows, first_rank, has_previous, has_next = get_snapshot_page(
+            self._snapshot.get_board(
+                'player_best_time', raid_type.id, scale.id
+            ),
+            'player_id',
+            after,
+            before,
+            limit
+        )
+
+        return LeaderboardPage(
+            runs=[
+                SnapshotPlayerBest(
+                    int(row['player_id']), int(row['time']),
+                    int(row['speedrun_time_id'])
+                )
+                for row in rows
+            ],
+            first_rank=first_rank,
+            has_previous=has_previous,
+            has_next=has_next
+        )
+
+
+def main() -> None:
+    write_snapshot(config.SNAPSHOT_PATH)
+    print(f'Wrote the leaderboard snapshot to {config.SNAPSHOT_PATH}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+from cache import MemoryCache
+from cache import get_cache
+from db import get_session
+from models.speedrun_time import SpeedrunTime
+from sqlalchemy import select
+from typing import NamedTuple
+import numpy as np
+
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 8
+
+
+class BoardStats(NamedTuple):
+    runs: int
+    teams: int
+    best: int
+    mean: float
+    # The time in ticks at each of PERCENTILES.
+    percentiles: dict[int, float]
+    # The number of runs in each bin and the HISTOGRAM_BINS + 1 bin edges.
+    histogram_counts: np.ndarray
+    histogram_edges: np.ndarray
+    # The (run number, time) of every run that set a new record, oldest
+    # first. Runs are numbered in the order they were submitted.
+    records: list[tuple[int, int]]
+
+
+def load_board_times(
+    raid_type_id: int, scale_id: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """ Returns the time and player group of every run on a board, in the
+        order they were submitted. Only the two columns are selected, so no
+        ORM objects are built.
+    """
+
+    with get_session() as session:
+        rows = session.execute(
+            select(SpeedrunTime.time, SpeedrunTime.player_group_id).where(
+                SpeedrunTime.raid_type_id == raid_type_id,
+                SpeedrunTime.scale_id == scale_id
+            ).order_by(SpeedrunTime.id)
+        ).all()
+
+    runs = np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+    return runs[:, 0], runs[:, 1]
+
+
+def compute_board_stats(
+    times: np.ndarray, player_group_ids: np.ndarray
+) -> BoardStats | None:
+    """ Computes the statistics of a board from its runs in submission
+        order. Returns None if the board has no runs.
+    """
+
+    if len(times) == 0:
+        return None
+
+    counts, edges = np.histogram(times, bins=HISTOGRAM_BINS)
+
+    # A run sets a record if it is faster than every run before it.
+    fastest_so_far = np.minimum.accumulate(times)
+    records = np.flatnonzero(
+        np.r_[True, fastest_so_far[1:] < fastest_so_far[:-1]]
+    )
+
+    return BoardStats(
+        runs=len(times),
+        teams=len(np.unique(player_group_ids)),
+        best=int(fastest_so_far[-1]),
+        mean=float(times.mean()),
+        percentiles=dict(zip(
+            PERCENTILES, np.percentile(times, PERCENTILES).tolist()
+        )),
+        histogram_counts=counts,
+        histogram_edges=edges,
+        records=[
+            (int(run) + 1, int(times[run])) for run in records
+        ]
+    )
+
+
+class Statistics():
+    """ The statistics of every raid type and scale. Each board's statistics
+        are computed on first use and kept in the cache until the next write
+        to that board, by registering invalidate() with
+        service.add_time_listener.
+    """
+
+    def __init__(self, cache: MemoryCache | None = None):
+        self._cache = cache or get_cache()
+
+    def get_stats(self, raid_type_id: int, scale_id: int) -> BoardStats | None:
+        """ Returns the statistics of a board, or None if it has no runs. """
+
+        return self._cache.get(
+            ('stats', raid_type_id, scale_id),
+            lambda: compute_board_stats(
+                *load_board_times(raid_type_id, scale_id)
+            )
+        )
+
+    def invalidate(
+        self, raid_type_id: int, scale_id: int, player_group_id: int
+    ) -> None:
+        """ Drops a board's statistics after one of its runs was saved or
+            deleted.
+        """
+
+        self._cache.invalidate(('stats', raid_type_id, scale_id))